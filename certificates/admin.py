@@ -2,7 +2,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import path, reverse
-from django.http import JsonResponse, HttpResponse
+from django.http import FileResponse, JsonResponse, HttpResponse
 from django.shortcuts import redirect
 from django.contrib import messages
 from django.template.response import TemplateResponse
@@ -11,15 +11,20 @@ import logging
 from django.db import transaction
 import json
 
-from .models import CertificateTemplate, GeneratedCertificate, CoursesHistory, TemplatePreview
+from .models import (
+    CertificateTemplate, GeneratedCertificate, CoursesHistory, TemplatePreview, RevokedCertificate,
+    VerificationEvent, CertificateVerificationCount, VerificationBundleExport, CertificateJob
+)
 from .services import CertificateService
+from .previews import current_preview, render_template_preview
+from .pagination import EstimatedCountPaginator
 
 logger = logging.getLogger(__name__)
 
 
 @admin.register(CertificateTemplate)
 class CertificateTemplateAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'layout_type', 'is_default', 'is_active', 'test_certificate', 'created_at')
+    list_display = ('id', 'name', 'layout_type', 'is_default', 'is_active', 'preview', 'test_certificate', 'created_at')
     list_filter = ('layout_type', 'is_default', 'is_active', 'created_at')
     search_fields = ('name', 'description', 'department_name')
     readonly_fields = ('id', 'created_at', 'updated_at')
@@ -28,7 +33,7 @@ class CertificateTemplateAdmin(admin.ModelAdmin):
             'fields': ('name', 'description', 'layout_type', 'is_active', 'is_default')
         }),
         ('Images and Backgrounds', {
-            'fields': ('logo', 'signature', 'background_image')
+            'fields': ('logo', 'signature', 'background_image', 'background_pdf')
         }),
         ('Header Information', {
             'fields': ('department_name', 'university_name', 'address')
@@ -58,6 +63,18 @@ class CertificateTemplateAdmin(admin.ModelAdmin):
     )
     actions = ['make_default']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('templatepreview')
+
+    def preview(self, obj):
+        preview = current_preview(obj)
+        if preview and preview.preview_image:
+            return format_html('<img src="{}" style="height: 80px; border: 1px solid #ccc;">',
+                               preview.preview_image.url)
+        return "✓" if preview else "En proceso"
+
+    preview.short_description = "Vista previa"
+
     def test_certificate(self, obj):
         if obj.id:
             return format_html(
@@ -90,38 +107,13 @@ class CertificateTemplateAdmin(admin.ModelAdmin):
         return custom_urls + urls
 
     def test_certificate_view(self, request, template_id):
-        """Generate a test certificate using real data"""
+        """Show the template's sample certificate, rendering it now if the stored preview is outdated"""
         try:
             template = CertificateTemplate.objects.get(id=template_id)
+            preview, _ = render_template_preview(template)
 
-            # Get a random professor with courses
-            course = CoursesHistory.objects.first()
-            if not course:
-                messages.error(request, "No hay datos de cursos disponibles para generar certificado de prueba.")
-                return redirect('admin:certificates_certificatetemplate_changelist')
-
-            # Get courses for this professor
-            courses = CoursesHistory.objects.filter(id_docente=course.id_docente)
-
-            # Generate test certificate
-            options = {
-                'id_docente': course.id_docente,
-                'destinatario': 'A QUIEN CORRESPONDA (PRUEBA)',
-                'incluir_qr': True,
-                'campos': ['periodo', 'materia', 'clave', 'nrc', 'fecha_inicio', 'fecha_fin', 'hr_cont']
-            }
-
-            pdf_content, verification_code = CertificateService.generate_pdf(
-                id_docente=course.id_docente,
-                courses=courses,
-                template=template,
-                options=options
-            )
-
-            # Return PDF directly
-            response = HttpResponse(pdf_content.read(), content_type='application/pdf')
-            response[
-                'Content-Disposition'] = f'inline; filename="testcert_{template.name}_{verification_code[:8]}.pdf"'
+            response = FileResponse(preview.preview_pdf.open(), content_type='application/pdf')
+            response['Content-Disposition'] = f'inline; filename="testcert_{template.name}.pdf"'
             return response
 
         except Exception as e:
@@ -142,6 +134,9 @@ class CoursesHistoryAdmin(admin.ModelAdmin):
     search_fields = ('profesor', 'materia', 'clave', 'nrc', 'id_docente')
     date_hierarchy = 'fecha_inicio'
     list_per_page = 50
+    # Fast-count mode: planner estimate for large tables, no second unfiltered COUNT(*)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     actions = ['generate_certificate_for_selected']
 
     def get_urls(self):
@@ -332,21 +327,13 @@ class CoursesHistoryAdmin(admin.ModelAdmin):
 
                     professor_name = courses.first().profesor
 
-                    pdf_content, verification_code = CertificateService.generate_pdf(
+                    CertificateService.issue_certificate(
                         id_docente=id_docente,
                         courses=courses,
                         template=template,
-                        options=options
-                    )
-
-                    certificate = GeneratedCertificate.objects.create(
-                        template=template,
-                        verification_code=verification_code,
-                        metadata={**options, 'professor_name': professor_name}
+                        options=options,
+                        professor_name=professor_name
                     )
-
-                    filename = f"certificate_{id_docente}_{verification_code[:8]}.pdf"
-                    certificate.file.save(filename, pdf_content)
                     generated_count += 1
 
             except Exception as e:
@@ -366,7 +353,9 @@ class GeneratedCertificateAdmin(admin.ModelAdmin):
     search_fields = ('verification_code', 'metadata__professor_name',
                      'metadata__id_docente')
     readonly_fields = ('id', 'verification_code', 'generated_at', 'metadata_display')
-    actions = ['regenerate_certificates']
+    actions = ['regenerate_certificates', 'revoke_certificates', 'export_verification_bundle']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_urls(self):
         urls = super().get_urls()
@@ -563,23 +552,14 @@ class GeneratedCertificateAdmin(admin.ModelAdmin):
                 'campos': ['periodo', 'materia', 'clave', 'nrc', 'fecha_inicio', 'fecha_fin', 'hr_cont']
             }
 
-            pdf_content, verification_code = CertificateService.generate_pdf(
+            certificate = CertificateService.issue_certificate(
                 id_docente=id_docente,
                 courses=courses,
                 template=template,
-                options=options
+                options=options,
+                professor_name=professor_name
             )
 
-            # Save certificate
-            certificate = GeneratedCertificate.objects.create(
-                template=template,
-                verification_code=verification_code,
-                metadata={**options, 'professor_name': professor_name}
-            )
-
-            filename = f"certificate_{id_docente}_{verification_code[:8]}.pdf"
-            certificate.file.save(filename, pdf_content)
-
             return {
                 'success': True,
                 'message': f'✅ Certificado generado exitosamente para {professor_name}',
@@ -640,22 +620,14 @@ class GeneratedCertificateAdmin(admin.ModelAdmin):
                     'campos': ['periodo', 'materia', 'clave', 'nrc', 'fecha_inicio', 'fecha_fin', 'hr_cont']
                 }
 
-                pdf_content, verification_code = CertificateService.generate_pdf(
+                certificate = CertificateService.issue_certificate(
                     id_docente=id_docente,
                     courses=courses,
                     template=template,
-                    options=options
-                )
-
-                # Save certificate
-                certificate = GeneratedCertificate.objects.create(
-                    template=template,
-                    verification_code=verification_code,
-                    metadata={**options, 'professor_name': professor_name}
+                    options=options,
+                    professor_name=professor_name
                 )
-
-                filename = f"certificate_{id_docente}_{verification_code[:8]}.pdf"
-                certificate.file.save(filename, pdf_content)
+                verification_code = certificate.verification_code
 
                 results['certificates'].append({
                     'id': certificate.id,
@@ -727,20 +699,16 @@ class GeneratedCertificateAdmin(admin.ModelAdmin):
                 if not courses.exists():
                     continue
 
-                options = certificate.metadata.copy()
-                pdf_content, verification_code = CertificateService.generate_pdf(
+                # Re-render the existing certificate with a freshly signed code
+                CertificateService.issue_certificate(
                     id_docente=id_docente,
                     courses=courses,
                     template=certificate.template,
-                    options=options
+                    options=certificate.metadata.copy(),
+                    professor_name=certificate.metadata.get('professor_name'),
+                    certificate=certificate
                 )
 
-                # Update existing certificate
-                certificate.verification_code = verification_code
-                filename = f"certificate_{id_docente}_{verification_code[:8]}.pdf"
-                certificate.file.save(filename, pdf_content)
-                certificate.save()
-
                 regenerated_count += 1
 
             except Exception as e:
@@ -751,8 +719,91 @@ class GeneratedCertificateAdmin(admin.ModelAdmin):
 
     regenerate_certificates.short_description = "Regenerar certificados seleccionados"
 
+    def revoke_certificates(self, request, queryset):
+        """Revoke selected certificates, keeping their records and files"""
+        revoked_count = 0
+        for certificate in queryset.filter(revocation__isnull=True):
+            RevokedCertificate.objects.create(certificate=certificate, revoked_by=request.user)
+            revoked_count += 1
+
+        self.message_user(request, f"Se revocaron {revoked_count} certificados.")
+
+    revoke_certificates.short_description = "Revocar certificados seleccionados"
+
+    def export_verification_bundle(self, request, queryset):
+        """Export a signed offline verification bundle of the selected certificates"""
+        from .bundles import export_verification_bundle
+
+        try:
+            export = export_verification_bundle(queryset=queryset, user=request.user)
+        except Exception as e:
+            self.message_user(request, f"Error exportando paquete de verificación: {str(e)}", level=messages.ERROR)
+            return
+
+        self.message_user(request, format_html(
+            'Paquete de verificación con {} certificados: <a href="{}">paquete</a> · <a href="{}">firma</a>',
+            export.certificate_count, export.file.url, export.signature_file.url
+        ))
+
+    export_verification_bundle.short_description = "Exportar paquete de verificación de los seleccionados"
+
+
+@admin.register(RevokedCertificate)
+class RevokedCertificateAdmin(admin.ModelAdmin):
+    list_display = ('certificate', 'revoked_by', 'revoked_at')
+    search_fields = ('certificate__verification_code', 'reason')
+    readonly_fields = ('revoked_at',)
+    raw_id_fields = ('certificate',)
+
+
+@admin.register(VerificationBundleExport)
+class VerificationBundleExportAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'is_delta', 'is_partial', 'since', 'until', 'certificate_count',
+                    'revoked_count', 'download_links')
+    list_filter = ('is_delta', 'is_partial')
+    readonly_fields = [field.name for field in VerificationBundleExport._meta.fields]
+
+    def has_add_permission(self, request):
+        # Bundles are created with the export_verification_bundle command or the certificate action
+        return False
+
+    def download_links(self, obj):
+        return format_html('<a href="{}">📦 Paquete</a> · <a href="{}">🔏 Firma</a>',
+                           obj.file.url, obj.signature_file.url)
+
+    download_links.short_description = "Archivos"
+
+
+@admin.register(VerificationEvent)
+class VerificationEventAdmin(admin.ModelAdmin):
+    list_display = ('verification_code', 'result', 'channel', 'ip_address', 'verified_at')
+    list_filter = ('result', 'channel', 'rolled_up')
+    search_fields = ('verification_code', 'ip_address')
+    readonly_fields = [field.name for field in VerificationEvent._meta.fields]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(CertificateVerificationCount)
+class CertificateVerificationCountAdmin(admin.ModelAdmin):
+    list_display = ('certificate', 'date', 'count')
+    list_filter = ('date',)
+    raw_id_fields = ('certificate',)
+
+
+@admin.register(CertificateJob)
+class CertificateJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'id_docente', 'template', 'status', 'reused', 'created_at', 'finished_at')
+    list_filter = ('status', 'reused')
+    search_fields = ('id_docente',)
+    readonly_fields = [field.name for field in CertificateJob._meta.fields]
+
+    def has_add_permission(self, request):
+        # Jobs are created by public certificate requests
+        return False
+
 
 @admin.register(TemplatePreview)
 class TemplatePreviewAdmin(admin.ModelAdmin):
-    list_display = ('template', 'generated_at')
-    readonly_fields = ('generated_at',)
\ No newline at end of file
+    list_display = ('template', 'template_version', 'generated_at')
+    readonly_fields = ('template_version', 'generated_at')
\ No newline at end of file
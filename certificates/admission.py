@@ -0,0 +1,95 @@
+# certificates/admission.py
+"""Admission control for PDF rendering.
+
+At most RENDER_MAX_CONCURRENCY renders run at once in a process; further
+renders queue for up to RENDER_QUEUE_WAIT seconds and are then rejected
+with RenderRejected, so a burst of certificate requests cannot take all
+the CPU from the rest of the site (verification in particular). Views
+turn a rejection into 503 + Retry-After, or a background job.
+
+A thread holds at most one slot: admit() inside an admitted block (a
+render within issue_certificate) runs in the slot already held.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Weight of the latest render in the average render time
+RENDER_TIME_SMOOTHING = 0.2
+
+
+class RenderRejected(Exception):
+    """No render slot became free within the queue-wait budget"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Demasiados certificados en generación; intente de nuevo en {retry_after} s')
+        self.retry_after = retry_after
+
+
+class RenderAdmission:
+    def __init__(self, max_concurrency, queue_wait):
+        self.max_concurrency = max_concurrency
+        self.queue_wait = queue_wait
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._held = threading.local()
+        self.running = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.average_render_seconds = 0.0
+
+    @contextmanager
+    def admit(self):
+        if getattr(self._held, 'slot', False):
+            yield
+            return
+
+        with self._lock:
+            self.waiting += 1
+        acquired = self._slots.acquire(timeout=self.queue_wait)
+        with self._lock:
+            self.waiting -= 1
+            if not acquired:
+                self.rejected += 1
+                raise RenderRejected(self.retry_after())
+            self.running += 1
+            self.admitted += 1
+
+        self._held.slot = True
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._held.slot = False
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self.running -= 1
+                self.average_render_seconds += RENDER_TIME_SMOOTHING * (elapsed - self.average_render_seconds)
+            self._slots.release()
+
+    def retry_after(self):
+        """Seconds until the renders queued now are likely to be done"""
+        backlog = (self.running + self.waiting) / self.max_concurrency
+        return max(1, math.ceil(backlog * (self.average_render_seconds or 1)))
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'max_concurrency': self.max_concurrency,
+                'queue_wait_seconds': self.queue_wait,
+                'running': self.running,
+                'queue_depth': self.waiting,
+                'admitted_total': self.admitted,
+                'rejected_total': self.rejected,
+                'average_render_seconds': round(self.average_render_seconds, 3),
+            }
+
+
+render_admission = RenderAdmission(
+    max_concurrency=settings.RENDER_MAX_CONCURRENCY,
+    queue_wait=settings.RENDER_QUEUE_WAIT
+)
@@ -5,3 +5,7 @@ from django.apps import AppConfig
 class CertificatesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'certificates'
+
+    def ready(self):
+        # Register signal receivers (verification index invalidation) and checks
+        from . import checks, signals
@@ -0,0 +1,141 @@
+# certificates/async_views.py
+"""Async variants of the public verification and job status endpoints.
+
+Served in place of the DRF views when the project runs under ASGI (see
+faculty_project/asgi_urls.py): the verification index, the details cache
+and the certificate lookup are awaited, so a worker keeps serving other
+requests while one waits on Redis or the database.
+"""
+import asyncio
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from core.routers import read_from_replica
+from .audit import record_verification
+from .models import GeneratedCertificate, CertificateJob
+from .verification import (
+    acheck_verification_code, certificate_revocation, index_version_is_shared,
+    INDEX_VERSION_KEY, CODE_INVALID, CODE_ABSENT, CODE_PRESENT, CODE_REVOKED
+)
+from .views import PUBLIC_API_INFO, job_payload, job_status, revoked_payload
+
+# Seconds between job status checks while long polling
+JOB_POLL_INTERVAL = 0.5
+
+
+def _details_cache_key(version, verification_code):
+    # The index version changes on every revocation or deletion, which
+    # invalidates the cached details with it
+    return f"certificates:verify_record:{version}:{verification_code}"
+
+
+@require_GET
+@read_from_replica
+async def public_verify_certificate(request):
+    """Async public_verify_certificate: same responses as the DRF view"""
+    verification_code = request.GET.get('code')
+
+    if not verification_code:
+        return JsonResponse({
+            'success': False,
+            'error': 'Código de verificación requerido. Use: ?code=VERIFICATION_CODE'
+        }, status=400)
+
+    not_found = {
+        'success': False,
+        'valid': False,
+        'message': 'Certificado no encontrado o código inválido',
+        'verification_code': verification_code
+    }
+
+    check = await acheck_verification_code(verification_code)
+    certificate_id = check.payload.certificate_id if check.payload else None
+    if check.state in (CODE_INVALID, CODE_ABSENT):
+        record_verification(request, verification_code, 'invalid' if check.state == CODE_INVALID else 'not_found',
+                            'public')
+        return JsonResponse(not_found, status=404)
+    if check.state == CODE_REVOKED:
+        record_verification(request, verification_code, 'revoked', 'public', certificate_id)
+        return JsonResponse(revoked_payload(verification_code, check.revocation))
+
+    details = request.GET.get('details') in ('1', 'true')
+    if check.payload and check.state == CODE_PRESENT and not details:
+        record_verification(request, verification_code, 'valid', 'public', certificate_id)
+        return JsonResponse({
+            'success': True,
+            'valid': True,
+            'message': 'Certificado válido',
+            'certificate': {
+                **check.payload.as_dict(),
+                'verification_code': verification_code
+            },
+            'details_url': f"/api/certificates/verify-public/?code={verification_code}&details=1"
+        })
+
+    # Only a shared version key is bumped by revocations in other processes
+    cache_key = None
+    if index_version_is_shared():
+        cache_key = _details_cache_key(await cache.aget(INDEX_VERSION_KEY), verification_code)
+    record = await cache.aget(cache_key) if cache_key else None
+    if record is None:
+        try:
+            certificate = await GeneratedCertificate.objects.select_related('template', 'revocation').aget(
+                verification_code=verification_code)
+        except GeneratedCertificate.DoesNotExist:
+            record_verification(request, verification_code, 'not_found', 'public')
+            return JsonResponse(not_found, status=404)
+
+        # Revoked after this process's index was built
+        revocation = certificate_revocation(certificate)
+        data = revoked_payload(verification_code, revocation) if revocation else {
+            'success': True,
+            'valid': True,
+            'message': 'Certificado válido',
+            'certificate': {
+                'id': certificate.id,
+                'verification_code': verification_code,
+                'professor_name': certificate.metadata.get('professor_name', 'Unknown'),
+                'id_docente': certificate.metadata.get('id_docente', 'Unknown'),
+                'template_name': certificate.template.name,
+                'generated_at': certificate.generated_at.isoformat(),
+                'file_url': certificate.file.url if certificate.file else None,
+                'metadata': certificate.metadata
+            }
+        }
+        record = (certificate.id, data)
+        if cache_key:
+            await cache.aset(cache_key, record, settings.VERIFY_DETAILS_CACHE_SECONDS)
+
+    certificate_id, data = record
+    record_verification(request, verification_code, 'revoked' if data.get('revoked') else 'valid', 'public',
+                        certificate_id)
+    return JsonResponse(data)
+
+
+@require_GET
+async def public_certificate_job(request, job_id):
+    """Async public_certificate_job: a long poll only holds a coroutine, not a worker thread"""
+    try:
+        wait = max(0, min(float(request.GET.get('wait') or 0), settings.CERTIFICATE_JOB_MAX_WAIT))
+    except ValueError:
+        return JsonResponse({'error': 'wait debe ser un número de segundos'}, status=400)
+
+    deadline = time.monotonic() + wait
+    while True:
+        job = await CertificateJob.objects.select_related('certificate__template').filter(id=job_id).afirst()
+        if job is None:
+            return JsonResponse({'success': False, 'error': 'Solicitud no encontrada'}, status=404)
+        if job.is_finished or time.monotonic() >= deadline:
+            response_status, headers = job_status(job)
+            return JsonResponse(job_payload(job), status=response_status, headers=headers)
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+
+
+@require_GET
+async def public_api_info(request):
+    """Get API information and documentation"""
+    return JsonResponse(PUBLIC_API_INFO)
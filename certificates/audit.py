@@ -0,0 +1,159 @@
+# certificates/audit.py
+"""Write-behind log of certificate verifications.
+
+Verify views only append to an in-process buffer; a background thread
+writes the buffer with bulk_create every VERIFICATION_AUDIT_BATCH_SIZE
+events or VERIFICATION_AUDIT_FLUSH_SECONDS, whichever comes first.
+rollup_verification_events() later folds the events into daily
+per-certificate counters (management command and Celery task).
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class VerificationEventBuffer:
+    def __init__(self, batch_size, flush_seconds, max_pending):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self._events = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.dropped = 0
+
+    def add(self, event):
+        with self._lock:
+            if len(self._events) >= self.max_pending:
+                # The database is not keeping up; keep memory bounded
+                self.dropped += 1
+                return
+            self._events.append(event)
+            pending = len(self._events)
+            if self._thread is None:
+                self._start()
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        with self._lock:
+            events, self._events = self._events, []
+        if not events:
+            return 0
+
+        from .models import VerificationEvent
+        try:
+            VerificationEvent.objects.bulk_create(events, batch_size=500)
+        except Exception as e:
+            logger.error(f"Could not write {len(events)} verification events: {e}")
+            return 0
+        return len(events)
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name='verification-audit', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_seconds)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                # This thread owns its own connection; don't keep it open between flushes
+                connections.close_all()
+
+
+_buffer = VerificationEventBuffer(
+    batch_size=settings.VERIFICATION_AUDIT_BATCH_SIZE,
+    flush_seconds=settings.VERIFICATION_AUDIT_FLUSH_SECONDS,
+    max_pending=settings.VERIFICATION_AUDIT_MAX_PENDING
+)
+atexit.register(_buffer.flush)
+
+
+def get_client_ip(request):
+    return request.META.get('REMOTE_ADDR') or None
+
+
+def record_verification(request, verification_code, result, channel, certificate_id=None):
+    """Queue a verification event; never blocks on the database"""
+    if not settings.VERIFICATION_AUDIT_ENABLED:
+        return
+
+    from .models import VerificationEvent
+    _buffer.add(VerificationEvent(
+        verification_code=verification_code[:64],
+        certificate_id=certificate_id,
+        result=result,
+        channel=channel,
+        ip_address=get_client_ip(request),
+        user_agent=request.META.get('HTTP_USER_AGENT', '')[:200],
+        verified_at=timezone.now()
+    ))
+
+
+def flush_verification_events():
+    """Write the pending events of this process now"""
+    return _buffer.flush()
+
+
+def _add_verification_count(certificate_id, date, total):
+    from .models import CertificateVerificationCount
+
+    counts = CertificateVerificationCount.objects.filter(certificate_id=certificate_id, date=date)
+    if counts.update(count=F('count') + total):
+        return
+    try:
+        with transaction.atomic():
+            CertificateVerificationCount.objects.create(certificate_id=certificate_id, date=date, count=total)
+    except IntegrityError:
+        # Another run created the counter after the update above
+        counts.update(count=F('count') + total)
+
+
+def rollup_verification_events(batch_size=10000):
+    """Add events not yet rolled up to the daily per-certificate counters.
+
+    Works in id ranges of batch_size so each transaction stays short.
+    Concurrent runs (the Celery task and the command) lock the events
+    they take and skip those locked by another run, so no event is
+    counted twice. Returns the number of events processed.
+    """
+    from .models import VerificationEvent, GeneratedCertificate
+
+    processed = 0
+    while True:
+        ids = list(VerificationEvent.objects.filter(rolled_up=False)
+                   .order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return processed
+
+        with transaction.atomic():
+            locked = list(VerificationEvent.objects.select_for_update(skip_locked=True)
+                          .filter(id__gte=ids[0], id__lte=ids[-1], rolled_up=False)
+                          .values_list('id', flat=True))
+            if not locked:
+                # Another run is rolling up this whole range
+                return processed
+
+            events = VerificationEvent.objects.filter(id__in=locked)
+            # Events may point to certificates deleted before they were written
+            totals = (events.filter(certificate__in=GeneratedCertificate.objects.values('id'))
+                      .annotate(date=TruncDate('verified_at'))
+                      .values('certificate_id', 'date')
+                      .annotate(total=Count('id'))
+                      # Counters are always locked in the same order, so runs can't deadlock
+                      .order_by('certificate_id', 'date'))
+            for row in totals:
+                _add_verification_count(row['certificate_id'], row['date'], row['total'])
+            processed += events.update(rolled_up=True)
@@ -0,0 +1,236 @@
+# certificates/bundles.py
+"""Signed offline verification bundles.
+
+A bundle is gzip-compressed JSON Lines. The first line is a header, then
+one line per valid certificate::
+
+    {"format": "certificados-verificacion", "version": 1, "delta": false, ...}
+    {"c": "<code>", "d": "<id_docente>", "n": "<professor>", "t": "<template>", "i": "2025-06-30"}
+
+Delta bundles hold the certificates whose code was issued or replaced
+(re-rendered) since the previous export, and list the codes revoked,
+replaced or deleted since then as ``{"c": "<code>", "r": true}``. The
+detached ``.sig`` file is JSON with the SHA-256 of the compressed file
+and its signature: Ed25519 when VERIFICATION_BUNDLE_SIGNING_KEY points to
+a private key (needs the ``cryptography`` package), otherwise
+HMAC-SHA256 with VERIFICATION_BUNDLE_SHARED_KEY.
+"""
+import base64
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import GeneratedCertificate, RetiredVerificationCode, RevokedCertificate, VerificationBundleExport
+
+try:
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+    CRYPTOGRAPHY_AVAILABLE = True
+except ImportError:
+    CRYPTOGRAPHY_AVAILABLE = False
+
+BUNDLE_FORMAT = 'certificados-verificacion'
+BUNDLE_VERSION = 1
+HASH_CHUNK_SIZE = 1024 * 1024
+RENDER_TIMEOUT = timedelta(hours=1)
+
+
+def _file_sha256(fileobj):
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.digest()
+
+
+def _load_private_key():
+    with open(settings.VERIFICATION_BUNDLE_SIGNING_KEY, 'rb') as key_file:
+        return serialization.load_pem_private_key(key_file.read(), password=None)
+
+
+def sign_digest(digest):
+    """Return the detached signature document for a SHA-256 digest"""
+    if settings.VERIFICATION_BUNDLE_SIGNING_KEY:
+        if not CRYPTOGRAPHY_AVAILABLE:
+            raise ImproperlyConfigured("Install 'cryptography' to sign bundles with VERIFICATION_BUNDLE_SIGNING_KEY")
+        private_key = _load_private_key()
+        public_key = private_key.public_key().public_bytes(
+            serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+        return {
+            'algorithm': 'ed25519',
+            'sha256': digest.hex(),
+            'key_id': hashlib.sha256(public_key).hexdigest()[:16],
+            'signature': base64.b64encode(private_key.sign(digest)).decode(),
+        }
+
+    if settings.VERIFICATION_BUNDLE_SHARED_KEY:
+        signature = hmac.new(settings.VERIFICATION_BUNDLE_SHARED_KEY.encode(), digest, hashlib.sha256).digest()
+        return {
+            'algorithm': 'hmac-sha256',
+            'sha256': digest.hex(),
+            'signature': base64.b64encode(signature).decode(),
+        }
+
+    raise ImproperlyConfigured(
+        'Set VERIFICATION_BUNDLE_SIGNING_KEY or VERIFICATION_BUNDLE_SHARED_KEY to sign verification bundles')
+
+
+def verify_bundle_signature(bundle_file, signature, public_key_pem=None):
+    """Check a bundle file object against its detached signature document.
+
+    Ed25519 signatures are checked with ``public_key_pem`` or, when not
+    given, with the public half of the configured signing key.
+    """
+    digest = _file_sha256(bundle_file)
+    if not hmac.compare_digest(digest.hex(), signature.get('sha256', '')):
+        return False
+
+    expected = base64.b64decode(signature.get('signature', ''))
+    if signature.get('algorithm') == 'ed25519':
+        if not CRYPTOGRAPHY_AVAILABLE:
+            raise ImproperlyConfigured("Install 'cryptography' to verify Ed25519 bundle signatures")
+        if public_key_pem:
+            public_key = serialization.load_pem_public_key(public_key_pem)
+        elif settings.VERIFICATION_BUNDLE_SIGNING_KEY:
+            public_key = _load_private_key().public_key()
+        else:
+            raise ImproperlyConfigured('A public key is needed to verify an Ed25519 bundle signature')
+        try:
+            public_key.verify(expected, digest)
+        except InvalidSignature:
+            return False
+        return True
+
+    if signature.get('algorithm') == 'hmac-sha256':
+        if not settings.VERIFICATION_BUNDLE_SHARED_KEY:
+            raise ImproperlyConfigured('VERIFICATION_BUNDLE_SHARED_KEY is needed to verify an HMAC bundle signature')
+        key = settings.VERIFICATION_BUNDLE_SHARED_KEY.encode()
+        return hmac.compare_digest(hmac.new(key, digest, hashlib.sha256).digest(), expected)
+
+    return False
+
+
+def generate_signing_key(path):
+    """Write a new Ed25519 private key (PEM) to path and return the public key PEM"""
+    if not CRYPTOGRAPHY_AVAILABLE:
+        raise ImproperlyConfigured("Install 'cryptography' to generate Ed25519 keys")
+    private_key = Ed25519PrivateKey.generate()
+    with open(path, 'wb') as key_file:
+        key_file.write(private_key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+    os.chmod(path, 0o600)
+    return private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+
+
+def get_delta_baseline():
+    """The last full or delta export, which a new delta continues from"""
+    return VerificationBundleExport.objects.filter(is_partial=False).order_by('-until').first()
+
+
+def export_verification_bundle(queryset=None, delta=False, chunk_size=None, user=None):
+    """Stream valid certificates into a signed bundle and record the export.
+
+    ``queryset`` restricts the export to a selection (a partial export).
+    With ``delta`` only certificates issued or re-rendered, and codes
+    revoked, replaced or deleted, since the previous full or delta export
+    are included.
+    """
+    chunk_size = chunk_size or settings.VERIFICATION_BUNDLE_CHUNK_SIZE
+    partial = queryset is not None
+    certificates = queryset if partial else GeneratedCertificate.objects.all()
+
+    # Stop before the oldest certificate still being rendered, so it is
+    # picked up by the next delta once it has its final code (reservations
+    # older than RENDER_TIMEOUT were abandoned)
+    until = timezone.now()
+    rendering_since = GeneratedCertificate.objects.filter(
+        verification_code__startswith='pending-', generated_at__gte=until - RENDER_TIMEOUT
+    ).aggregate(oldest=Min('generated_at'))['oldest']
+    if rendering_since and rendering_since < until:
+        until = rendering_since
+
+    since = None
+    if delta:
+        baseline = get_delta_baseline()
+        if baseline is None:
+            raise ValueError('No hay una exportación previa; genere primero un paquete completo')
+        since = baseline.until
+
+    certificates = certificates.filter(revocation__isnull=True, code_changed_at__lte=until).exclude(
+        verification_code__startswith='pending-')
+    revoked = RevokedCertificate.objects.none()
+    retired = RetiredVerificationCode.objects.none()
+    if since:
+        certificates = certificates.filter(code_changed_at__gt=since)
+        revoked = RevokedCertificate.objects.filter(revoked_at__gt=since, revoked_at__lte=until)
+        retired = RetiredVerificationCode.objects.filter(retired_at__gt=since, retired_at__lte=until)
+
+    rows = certificates.order_by('id').values_list(
+        'verification_code', 'metadata__id_docente', 'metadata__professor_name', 'template__name', 'code_changed_at')
+
+    header = {
+        'format': BUNDLE_FORMAT,
+        'version': BUNDLE_VERSION,
+        'delta': delta,
+        'since': since.isoformat() if since else None,
+        'until': until.isoformat(),
+        'generated_at': timezone.now().isoformat(),
+    }
+
+    certificate_count = revoked_count = 0
+    with tempfile.TemporaryFile() as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as bundle:
+            bundle.write(_json_line(header))
+            for code, id_docente, professor_name, template_name, issued_at in rows.iterator(chunk_size=chunk_size):
+                bundle.write(_json_line({
+                    'c': code,
+                    # SQLite's JSON extraction turns numeric strings into numbers
+                    'd': str(id_docente) if id_docente is not None else None,
+                    'n': professor_name,
+                    't': template_name,
+                    # The date the current code was issued, as printed on the document
+                    'i': timezone.localdate(issued_at).isoformat(),
+                }))
+                certificate_count += 1
+            for codes in (revoked.values_list('certificate__verification_code', flat=True),
+                          retired.values_list('code', flat=True)):
+                for code in codes.iterator(chunk_size=chunk_size):
+                    bundle.write(_json_line({'c': code, 'r': True}))
+                    revoked_count += 1
+
+        signature = sign_digest(_file_sha256(raw))
+
+        export = VerificationBundleExport(
+            is_delta=delta,
+            is_partial=partial,
+            since=since,
+            until=until,
+            certificate_count=certificate_count,
+            revoked_count=revoked_count,
+            created_by=user
+        )
+        name = f"verificacion_{'delta' if delta else 'parcial' if partial else 'completo'}_{until:%Y%m%d%H%M%S}.jsonl.gz"
+        export.file.save(name, File(raw), save=False)
+        export.signature_file.save(f"{name}.sig", ContentFile(json.dumps(signature, indent=2).encode()), save=False)
+        export.save()
+
+    return export
+
+
+def _json_line(data):
+    return (json.dumps(data, ensure_ascii=False, separators=(',', ':')) + '\n').encode()
@@ -0,0 +1,16 @@
+# certificates/checks.py
+from django.core.checks import Warning, register
+
+
+@register()
+def check_preview_thumbnails(app_configs, **kwargs):
+    """Template previews need PyMuPDF for their PNG thumbnail"""
+    from .previews import PYMUPDF_AVAILABLE
+
+    if PYMUPDF_AVAILABLE:
+        return []
+    return [Warning(
+        'PyMuPDF is not installed: template previews are stored without their PNG thumbnail',
+        hint="Install the requirements: pip install -r requirements.txt",
+        id='certificates.W001',
+    )]
@@ -0,0 +1,209 @@
+# certificates/course_loader.py
+"""Load a professor's course history once per request.
+
+Validating a certificate request, choosing sync or background mode,
+fingerprinting it and rendering it all look at the same courses. They
+share one ProfessorCourses, fetched with a single query limited to the
+columns a certificate uses, instead of each querying CoursesHistory.
+
+The same query groups cross-listed courses: window aggregates give every
+row its group's size and total hours, so the course table is assembled
+in one pass over the rows (table_rows()) without sorting or summing.
+"""
+from datetime import date, datetime
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+from django.db.models import Count, F, Sum, Window
+
+from .models import CoursesHistory
+
+# Last two digits of a periodo code -> season
+PERIODO_TEMPORADAS = {
+    '25': 'Primavera',
+    '35': 'Otoño',
+    '30': 'Interperiodo',
+}
+
+
+class CourseRecord(NamedTuple):
+    """The columns of a CoursesHistory row that a certificate uses.
+
+    A tuple is a fraction of the size of a model instance (no __dict__,
+    no model state, ~35 fewer fields), which matters for bulk runs that
+    hold thousands of professors' courses.
+    """
+    id: int
+    profesor: str
+    periodo: str
+    materia: str
+    clave: str
+    nrc: str
+    fecha_inicio: date
+    fecha_fin: date
+    hr_cont: int
+    listas_cruzadas: Optional[str]
+    updated_at: datetime
+    # Size and total hours of the cross-listed group, annotated by the query
+    group_size: Optional[int] = None
+    group_hr_cont: Optional[int] = None
+
+
+class CourseRow(NamedTuple):
+    """One row of the certificate's course table.
+
+    A cross-listed group (is_grouped) has lists in materia, clave and nrc,
+    one entry per member course, and the summed hr_cont.
+    """
+    periodo: str
+    materia: object
+    clave: object
+    nrc: object
+    fecha_inicio: date
+    fecha_fin: date
+    hr_cont: int
+    listas_cruzadas: Optional[str]
+    is_grouped: bool
+    course_count: int
+    grouped_courses: tuple = ()
+
+
+# Columns read by validation, fingerprinting and the certificate table
+RENDER_FIELDS = CourseRecord._fields[:-2]
+
+
+@lru_cache(maxsize=1024)
+def periodo_label(periodo):
+    """Readable label of a periodo code (202525 -> Primavera 2025), computed once per code"""
+    str_periodo = str(periodo)
+    if any(temporada in str_periodo for temporada in PERIODO_TEMPORADAS.values()):
+        return str_periodo
+    temporada = PERIODO_TEMPORADAS.get(str_periodo[-2:])
+    return f"{temporada} {str_periodo[:4]}" if temporada else str_periodo
+
+
+def with_course_groups(courses):
+    """Annotate courses with the size and total hours of their cross-listed group.
+
+    Courses sharing a listas_cruzadas code in the same periodo form a
+    group. The values are meaningless for courses without a code, which
+    are never grouped.
+    """
+    group = [F('id_docente'), F('periodo'), F('listas_cruzadas')]
+    return courses.annotate(
+        group_size=Window(Count('id'), partition_by=group),
+        group_hr_cont=Window(Sum('hr_cont'), partition_by=group),
+    ).order_by('periodo', 'materia', 'nrc', 'id')
+
+
+class ProfessorCourses:
+    """A professor's courses as CourseRecords, in CoursesHistory order.
+
+    Offers the parts of the QuerySet API the certificate code used
+    (exists, first, count, iteration) plus periodo filters that run on
+    the loaded rows. A cross-listed group never spans two periodos, so
+    the filtered rows keep complete groups.
+    """
+
+    def __init__(self, courses):
+        self.courses = list(courses)
+
+    @classmethod
+    def load(cls, id_docente):
+        return cls.of(CoursesHistory.objects.filter(id_docente=id_docente))
+
+    @classmethod
+    def of(cls, courses):
+        """Accept a CoursesHistory queryset (evaluated once) or an already loaded instance"""
+        if isinstance(courses, cls):
+            return courses
+        return cls(map(CourseRecord._make,
+                       with_course_groups(courses).values_list(*RENDER_FIELDS, 'group_size', 'group_hr_cont')))
+
+    def __iter__(self):
+        return iter(self.courses)
+
+    def __len__(self):
+        return len(self.courses)
+
+    def exists(self):
+        return bool(self.courses)
+
+    def count(self):
+        return len(self.courses)
+
+    def first(self):
+        return self.courses[0] if self.courses else None
+
+    def in_periodos(self, periodos):
+        periodos = set(periodos)
+        return ProfessorCourses(course for course in self.courses if course.periodo in periodos)
+
+    def split_periodo(self, periodo):
+        """Return (courses of periodo, all other courses)"""
+        return (
+            ProfessorCourses(course for course in self.courses if course.periodo == periodo),
+            ProfessorCourses(course for course in self.courses if course.periodo != periodo),
+        )
+
+    def table_rows(self):
+        """The CourseRows of the certificate's course table.
+
+        A group takes the place of its first course; its members arrive
+        already sorted by materia and the query supplies the group's size
+        and total hours.
+        """
+        rows = []
+        pending = {}
+        for course in self.courses:
+            if not course.listas_cruzadas or course.group_size == 1:
+                rows.append(CourseRow(
+                    periodo=periodo_label(course.periodo),
+                    materia=course.materia,
+                    clave=course.clave,
+                    nrc=course.nrc,
+                    fecha_inicio=course.fecha_inicio,
+                    fecha_fin=course.fecha_fin,
+                    hr_cont=course.hr_cont,
+                    listas_cruzadas=course.listas_cruzadas,
+                    is_grouped=False,
+                    course_count=1
+                ))
+                continue
+
+            key = (course.periodo, course.listas_cruzadas)
+            if key not in pending:
+                pending[key] = (len(rows), [])
+                rows.append(None)
+            position, members = pending[key]
+            members.append(course)
+            if len(members) < course.group_size:
+                continue
+
+            base_course = members[0]
+            rows[position] = CourseRow(
+                periodo=periodo_label(base_course.periodo),
+                materia=[member.materia for member in members],
+                clave=[member.clave for member in members],
+                nrc=[member.nrc for member in members],
+                fecha_inicio=base_course.fecha_inicio,
+                fecha_fin=base_course.fecha_fin,
+                hr_cont=course.group_hr_cont,
+                listas_cruzadas=base_course.listas_cruzadas,
+                is_grouped=True,
+                course_count=len(members),
+                grouped_courses=tuple(members)
+            )
+        return rows
+
+
+def load_professor_courses(id_docente, request=None):
+    """ProfessorCourses of id_docente, loaded at most once per request"""
+    if request is None:
+        return ProfessorCourses.load(id_docente)
+    loaded = getattr(request, '_professor_courses', None)
+    if loaded is None:
+        loaded = request._professor_courses = {}
+    if id_docente not in loaded:
+        loaded[id_docente] = ProfessorCourses.load(id_docente)
+    return loaded[id_docente]
@@ -0,0 +1,87 @@
+# certificates/letterhead.py
+"""Letterhead backgrounds (CertificateTemplate.background_pdf).
+
+The first page of the background PDF is parsed once per template
+version and kept as a Letterhead: its content stream and resources,
+ready to become a form XObject. Each certificate then only adds that
+form to its own writer once and draws it under every page, instead of
+re-reading the background and merging content streams page by page.
+"""
+from functools import lru_cache
+
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import ArrayObject, DecodedStreamObject, DictionaryObject, NameObject
+
+from .verification import get_template_version
+
+LETTERHEAD_NAME = NameObject('/Letterhead')
+
+
+class Letterhead:
+    """The parsed first page of a background PDF"""
+
+    def __init__(self, path):
+        page = PdfReader(path).pages[0]
+        self.content = page.get_contents().get_data() if page.get_contents() else b''
+        self.resources = page.get('/Resources', DictionaryObject()).get_object()
+        self.box = page.mediabox
+        # Resolve every object the resources refer to now, so copying them
+        # into a writer later never reads from the file again
+        self.resources.clone(PdfWriter())
+
+    def form(self, writer):
+        """Add the letterhead to writer as a form XObject; returns its reference"""
+        form = DecodedStreamObject()
+        form.set_data(self.content)
+        form.update({
+            NameObject('/Type'): NameObject('/XObject'),
+            NameObject('/Subtype'): NameObject('/Form'),
+            NameObject('/BBox'): self.box,
+            NameObject('/Resources'): self.resources.clone(writer),
+        })
+        return writer._add_object(form)
+
+    def placement(self, page):
+        """Content stream operators that draw the form scaled to page"""
+        box = page.mediabox
+        scale_x = float(box.width) / float(self.box.width)
+        scale_y = float(box.height) / float(self.box.height)
+        offset_x = float(box.left) - float(self.box.left) * scale_x
+        offset_y = float(box.bottom) - float(self.box.bottom) * scale_y
+        return f"q {scale_x:g} 0 0 {scale_y:g} {offset_x:g} {offset_y:g} cm {LETTERHEAD_NAME} Do Q\n".encode()
+
+
+@lru_cache(maxsize=8)
+def _load_letterhead(path, template_version):
+    return Letterhead(path)
+
+
+def letterhead_for(template):
+    """The Letterhead of template's background_pdf, parsed once per template version"""
+    return _load_letterhead(template.background_pdf.path, get_template_version(template))
+
+
+def apply_letterhead(source, output, letterhead):
+    """Write the PDF in source to output with letterhead drawn under every page.
+
+    The outline (the bookmarks of a batch) is carried over.
+    """
+    writer = PdfWriter()
+    writer.append(PdfReader(source), import_outline=True)
+    form = letterhead.form(writer)
+
+    def content(data):
+        stream = DecodedStreamObject()
+        stream.set_data(data)
+        return writer._add_object(stream)
+
+    for page in writer.pages:
+        resources = page['/Resources'].get_object()
+        if '/XObject' not in resources:
+            resources[NameObject('/XObject')] = DictionaryObject()
+        resources['/XObject'].get_object()[LETTERHEAD_NAME] = form
+
+        contents = page['/Contents'].get_object()
+        contents = list(contents) if isinstance(contents, ArrayObject) else [page.raw_get('/Contents')]
+        page[NameObject('/Contents')] = ArrayObject([content(letterhead.placement(page)), *contents])
+    writer.write(output)
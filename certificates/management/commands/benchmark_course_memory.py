@@ -0,0 +1,71 @@
+import gc
+import time
+import tracemalloc
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from certificates.course_loader import CourseRecord, RENDER_FIELDS
+from certificates.models import CoursesHistory
+from certificates.services import CertificateService
+
+
+class Command(BaseCommand):
+    help = ('Measure the memory a bulk run needs to hold many professors\' courses and their '
+            'table rows: CoursesHistory instances with dict rows versus CourseRecord/CourseRow tuples.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--professors', type=int, default=1000, help='Professors to load')
+
+    def handle(self, *args, **options):
+        id_docentes = list(CoursesHistory.objects.order_by('id_docente')
+                           .values_list('id_docente', flat=True).distinct()[:options['professors']])
+        if not id_docentes:
+            self.stdout.write(self.style.ERROR('No course data available. Please import data first.'))
+            return
+        courses = CoursesHistory.objects.filter(id_docente__in=id_docentes)
+        self.stdout.write(f"Professors: {len(id_docentes)}, courses: {courses.count()}")
+
+        results = {
+            'model instances + dict rows': self.measure(lambda: self.load_models(courses)),
+            'CourseRecord + CourseRow': self.measure(lambda: self.load_records(courses)),
+        }
+        baseline = results['model instances + dict rows']
+        for name, (held, peak, elapsed) in results.items():
+            self.stdout.write(
+                f"{name:30} held {held / 1024 / 1024:7.2f} MB  peak {peak / 1024 / 1024:7.2f} MB  "
+                f"{elapsed * 1000:7.0f}ms  ({held / baseline[0]:.0%} of baseline)")
+
+    @staticmethod
+    def measure(load):
+        """Memory still held by load()'s result, the peak while building it, and the time taken"""
+        gc.collect()
+        tracemalloc.start()
+        started = time.perf_counter()
+        result = load()
+        elapsed = time.perf_counter() - started
+        held, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del result
+        return held, peak, elapsed
+
+    @staticmethod
+    def load_models(courses):
+        # How the render pipeline held courses before: full model instances
+        # and one dict per table row
+        by_professor = defaultdict(list)
+        for course in courses:
+            by_professor[course.id_docente].append(course)
+        return {
+            id_docente: (rows, [row._asdict() for row in CertificateService.group_courses_by_listas_cruzadas(rows)])
+            for id_docente, rows in by_professor.items()
+        }
+
+    @staticmethod
+    def load_records(courses):
+        by_professor = defaultdict(list)
+        for id_docente, *values in courses.values_list('id_docente', *RENDER_FIELDS):
+            by_professor[id_docente].append(CourseRecord(*values))
+        return {
+            id_docente: (rows, CertificateService.group_courses_by_listas_cruzadas(rows))
+            for id_docente, rows in by_professor.items()
+        }
@@ -0,0 +1,86 @@
+import random
+import statistics
+import time
+from collections import defaultdict
+from datetime import date, datetime
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from certificates.course_loader import CourseRecord, ProfessorCourses
+from certificates.models import CertificateTemplate
+from certificates.services import CertificateService
+
+
+class Command(BaseCommand):
+    help = ('Benchmark certificate rendering for synthetic course histories of growing size, '
+            'with the regular Table layout and the LongTable layout (CERTIFICATE_LONG_TABLE_ROWS).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', default='10,100,1000,5000', help='Comma-separated course counts')
+        parser.add_argument('--repeat', type=int, default=1, help='Renders per size and layout (median is shown)')
+        parser.add_argument('--template_id', type=int, help='Template ID to use')
+
+    def handle(self, *args, **options):
+        if options['template_id']:
+            template = CertificateTemplate.objects.get(id=options['template_id'])
+        else:
+            template = CertificateTemplate.objects.filter(is_default=True).first() or CertificateTemplate.objects.first()
+        if not template:
+            self.stdout.write(self.style.ERROR('No templates available'))
+            return
+
+        layouts = {
+            'Table': override_settings(CERTIFICATE_LONG_TABLE_ROWS=10 ** 9),
+            'LongTable': override_settings(CERTIFICATE_LONG_TABLE_ROWS=0),
+        }
+        self.stdout.write(f"{'courses':>8} {'layout':>10} {'render':>10} {'per course':>11} {'pages':>6}")
+        for count in [int(value) for value in options['rows'].split(',')]:
+            courses = self.synthetic_courses(count)
+            for name, layout in layouts.items():
+                timings = []
+                with layout:
+                    for _ in range(options['repeat']):
+                        started = time.perf_counter()
+                        pdf_content, _ = CertificateService.generate_pdf(
+                            'BENCHMARK', courses, template, {'verification_code': 'BENCHMARK'})
+                        timings.append(time.perf_counter() - started)
+                elapsed = statistics.median(timings)
+                pages = pdf_content.read().count(b'/Type /Page\n') or '?'
+                self.stdout.write(f"{count:>8} {name:>10} {elapsed * 1000:>8.0f}ms "
+                                  f"{elapsed / count * 1000:>9.2f}ms {pages:>6}")
+
+    @staticmethod
+    def synthetic_courses(count):
+        """count courses of one professor, about a third of them in cross-listed groups"""
+        rng = random.Random(count)
+        records = []
+        group = 0
+        while len(records) < count:
+            periodo = f"{2000 + len(records) // 40}{rng.choice(['25', '30', '35'])}"
+            size = min(rng.choice([1, 1, 1, 1, 2, 3]), count - len(records))
+            listas_cruzadas = f"L{group % 1000}" if size > 1 else None
+            group += 1
+            for _ in range(size):
+                records.append(CourseRecord(
+                    id=len(records) + 1,
+                    profesor='PROFESOR DE PRUEBA',
+                    periodo=periodo,
+                    materia=f"MATERIA DE PRUEBA {rng.randint(1, 300)}",
+                    clave=f"MATS {rng.randint(1, 999):03d}",
+                    nrc=str(20000 + len(records)),
+                    fecha_inicio=date(2020, 1, 13),
+                    fecha_fin=date(2020, 5, 15),
+                    hr_cont=rng.choice([45, 60, 90]),
+                    listas_cruzadas=listas_cruzadas,
+                    updated_at=datetime(2020, 1, 1),
+                    group_size=size,
+                ))
+
+        # What with_course_groups() would have annotated
+        hours = defaultdict(int)
+        for record in records:
+            hours[record.periodo, record.listas_cruzadas] += record.hr_cont
+        records = [record._replace(group_hr_cont=hours[record.periodo, record.listas_cruzadas])
+                   for record in records]
+        records.sort(key=lambda record: (record.periodo, record.materia, record.nrc, record.id))
+        return ProfessorCourses(records)
@@ -0,0 +1,89 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from certificates.models import CertificateTemplate, CoursesHistory, GeneratedCertificate
+from certificates.services import CertificateService
+
+
+class Command(BaseCommand):
+    help = ('Benchmark concurrent certificate generation against the configured database. '
+            'Run it once per DATABASE_URL profile (SQLite / PostgreSQL) to compare them.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent worker threads')
+        parser.add_argument('--requests', type=int, default=40, help='Total certificates to generate')
+        parser.add_argument('--template_id', type=int, help='Template ID to use')
+        parser.add_argument('--keep', action='store_true', help='Keep generated certificates')
+
+    def handle(self, *args, **options):
+        if options['template_id']:
+            template = CertificateTemplate.objects.get(id=options['template_id'])
+        else:
+            template = CertificateTemplate.objects.filter(is_default=True).first() or CertificateTemplate.objects.first()
+        if not template:
+            self.stdout.write(self.style.ERROR('No templates available'))
+            return
+
+        id_docentes = list(CoursesHistory.objects.values_list('id_docente', flat=True).distinct()[:options['requests']])
+        if not id_docentes:
+            self.stdout.write(self.style.ERROR('No course data available. Please import data first.'))
+            return
+
+        # Cycle over the available professors until the request count is reached
+        workload = [id_docentes[i % len(id_docentes)] for i in range(options['requests'])]
+
+        self.stdout.write(f"Database: {connection.vendor} ({connection.settings_dict['NAME']})")
+        self.stdout.write(f"Workers: {options['workers']}, requests: {len(workload)}, template: {template.name}")
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            results = list(executor.map(lambda id_docente: self.generate_one(id_docente, template), workload))
+        elapsed = time.perf_counter() - started
+
+        latencies = [r['elapsed'] for r in results if r['certificate_id']]
+        errors = [r['error'] for r in results if r['error']]
+        locked = [e for e in errors if 'locked' in e]
+
+        self.stdout.write(f"Elapsed: {elapsed:.2f}s")
+        self.stdout.write(f"Throughput: {len(latencies) / elapsed:.2f} certificates/s")
+        if latencies:
+            latencies.sort()
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            self.stdout.write(f"Latency p50: {statistics.median(latencies) * 1000:.0f}ms, p95: {p95 * 1000:.0f}ms")
+        self.stdout.write(f"Errors: {len(errors)} ({len(locked)} 'database is locked')")
+        for error in errors[:5]:
+            self.stdout.write(self.style.WARNING(f"  {error}"))
+
+        if not options['keep']:
+            for certificate in GeneratedCertificate.objects.filter(
+                    id__in=[r['certificate_id'] for r in results if r['certificate_id']]):
+                certificate.file.delete(save=False)
+                certificate.delete()
+
+    def generate_one(self, id_docente, template):
+        """Generate and store one certificate, the same work the public endpoint does"""
+        started = time.perf_counter()
+        try:
+            courses = CoursesHistory.objects.filter(id_docente=id_docente)
+            professor_name = courses.first().profesor
+            options = {
+                'id_docente': id_docente,
+                'destinatario': 'A QUIEN CORRESPONDA (BENCHMARK)',
+                'incluir_qr': True,
+                'campos': ['periodo', 'materia', 'clave', 'nrc', 'fecha_inicio', 'fecha_fin', 'hr_cont']
+            }
+            certificate = CertificateService.issue_certificate(
+                id_docente=id_docente,
+                courses=courses,
+                template=template,
+                options=options,
+                professor_name=professor_name
+            )
+            return {'certificate_id': certificate.id, 'elapsed': time.perf_counter() - started, 'error': None}
+        except Exception as e:
+            return {'certificate_id': None, 'elapsed': time.perf_counter() - started, 'error': str(e)}
+        finally:
+            connections.close_all()
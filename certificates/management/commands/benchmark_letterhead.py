@@ -0,0 +1,108 @@
+import time
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from PIL import Image as PILImage
+from PyPDF2 import PdfReader, PdfWriter
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas as pdf_canvas
+from certificates.course_loader import ProfessorCourses
+from certificates.letterhead import Letterhead, apply_letterhead
+from certificates.models import CertificateTemplate, CoursesHistory
+from certificates.services import CertificateService
+
+
+class Command(BaseCommand):
+    help = ('Benchmark putting a letterhead (background_pdf) under a bulk run of certificates: '
+            'the background parsed once and drawn as a form XObject versus re-reading and '
+            'merging it for every certificate.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--certificates', type=int, default=50, help='Certificates in the run')
+        parser.add_argument('--template_id', type=int, help='Template ID to use')
+        parser.add_argument('--background', help="Background PDF (default: the template's background_pdf, "
+                                                 "else a generated letterhead)")
+
+    def handle(self, *args, **options):
+        if options['template_id']:
+            template = CertificateTemplate.objects.get(id=options['template_id'])
+        else:
+            template = CertificateTemplate.objects.filter(is_default=True).first() or CertificateTemplate.objects.first()
+        if not template:
+            self.stdout.write(self.style.ERROR('No templates available'))
+            return
+
+        if options['background']:
+            background = options['background']
+        elif template.background_pdf:
+            background = template.background_pdf.path
+        else:
+            background = self.synthetic_letterhead()
+        # Bodies are rendered without a letterhead; both strategies add it afterwards
+        template.background_pdf = None
+
+        id_docentes = list(CoursesHistory.objects.order_by('id_docente')
+                           .values_list('id_docente', flat=True).distinct()[:options['certificates']])
+        if not id_docentes:
+            self.stdout.write(self.style.ERROR('No course data available. Please import data first.'))
+            return
+        bodies = []
+        while len(bodies) < options['certificates']:
+            id_docente = id_docentes[len(bodies) % len(id_docentes)]
+            pdf_content, _ = CertificateService.generate_pdf(
+                id_docente, ProfessorCourses.load(id_docente), template, {'verification_code': 'BENCHMARK'})
+            bodies.append(pdf_content.read())
+        self.stdout.write(f"Certificates: {len(bodies)}, pages: {sum(len(PdfReader(BytesIO(body)).pages) for body in bodies)}")
+
+        results = {
+            're-read and merge per certificate': self.measure(bodies, lambda body: self.reread_background(body, background)),
+            'cached form XObject': self.measure(bodies, self.cached_form(background)),
+        }
+        baseline = results['re-read and merge per certificate'][0]
+        for name, (elapsed, size) in results.items():
+            self.stdout.write(
+                f"{name:36} {elapsed * 1000:8.0f}ms  {elapsed / len(bodies) * 1000:7.1f}ms/certificate  "
+                f"{size / len(bodies) / 1024:7.1f} KB/certificate  ({baseline / elapsed:.1f}x)")
+
+    @staticmethod
+    def measure(bodies, overlay):
+        started = time.perf_counter()
+        sizes = [len(overlay(body)) for body in bodies]
+        return time.perf_counter() - started, sum(sizes)
+
+    @staticmethod
+    def cached_form(background):
+        # What letterhead_for() caches per template version
+        letterhead = Letterhead(background)
+
+        def overlay(body):
+            output = BytesIO()
+            apply_letterhead(BytesIO(body), output, letterhead)
+            return output.getvalue()
+        return overlay
+
+    @staticmethod
+    def reread_background(body, background):
+        """The plain PyPDF2 overlay: per page, a freshly read background page merged with the content"""
+        writer = PdfWriter()
+        for page in PdfReader(BytesIO(body)).pages:
+            writer.add_page(PdfReader(background).pages[0])
+            writer.pages[-1].merge_page(page)
+        output = BytesIO()
+        writer.write(output)
+        return output.getvalue()
+
+    @staticmethod
+    def synthetic_letterhead():
+        """A letter page with a photographic header band and a text footer"""
+        header = PILImage.effect_noise((1200, 200), 40).convert('RGB')
+        buffer = BytesIO()
+        canvas = pdf_canvas.Canvas(buffer, pagesize=letter)
+        canvas.drawImage(ImageReader(header), 36, letter[1] - 96, letter[0] - 72, 72)
+        canvas.setFont('Times-Bold', 10)
+        canvas.drawCentredString(letter[0] / 2, 36, 'Benemérita Universidad Autónoma de Puebla')
+        canvas.showPage()
+        canvas.save()
+        buffer.seek(0)
+        return buffer
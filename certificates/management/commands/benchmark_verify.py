@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from certificates.models import GeneratedCertificate
+
+VERIFY_URL = '/api/certificates/verify-public/'
+
+
+class Command(BaseCommand):
+    help = ('Compare concurrent verify-public requests through the WSGI path (DRF view, thread pool) '
+            'and the ASGI path (async view, event loop)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per path')
+        parser.add_argument('--concurrency', type=int, default=20, help='Requests in flight at once')
+        parser.add_argument('--code', help='Verification code to check (default: latest certificate)')
+        parser.add_argument('--details', action='store_true', help='Ask for the stored details (?details=1)')
+
+    def handle(self, *args, **options):
+        code = options['code'] or (GeneratedCertificate.objects.exclude(verification_code__startswith='pending-')
+                                   .order_by('-id').values_list('verification_code', flat=True).first())
+        if not code:
+            self.stdout.write(self.style.ERROR('No certificates available. Generate one first.'))
+            return
+
+        params = {'code': code}
+        if options['details']:
+            params['details'] = '1'
+
+        self.stdout.write(f"Code: {code}")
+        self.stdout.write(f"Requests: {options['requests']} per path, concurrency: {options['concurrency']}")
+
+        # Unknown codes would log a "Not Found" warning per request
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            self.report('WSGI', *self.run_sync(params, options['requests'], options['concurrency']))
+            with override_settings(ROOT_URLCONF='faculty_project.asgi_urls'):
+                self.report('ASGI', *asyncio.run(self.run_async(params, options['requests'], options['concurrency'])))
+
+    def run_sync(self, params, requests, concurrency):
+        local = threading.local()
+
+        def verify(_):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            started = time.perf_counter()
+            response = local.client.get(VERIFY_URL, params)
+            return response.status_code, time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(verify, range(requests)))
+        return results, time.perf_counter() - started
+
+    async def run_async(self, params, requests, concurrency):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def verify():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(VERIFY_URL, params)
+                return response.status_code, time.perf_counter() - started
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(verify() for _ in range(requests)))
+        return results, time.perf_counter() - started
+
+    def report(self, label, results, elapsed):
+        latencies = sorted(latency for _, latency in results)
+        failed = sum(1 for status_code, _ in results if status_code != 200)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        self.stdout.write(
+            f"{label}: {len(results) / elapsed:.0f} req/s, "
+            f"p50 {statistics.median(latencies) * 1000:.1f}ms, p95 {p95 * 1000:.1f}ms, "
+            f"errors {failed}"
+        )
@@ -0,0 +1,66 @@
+import json
+import shutil
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from certificates.bundles import export_verification_bundle, generate_signing_key, verify_bundle_signature
+
+
+class Command(BaseCommand):
+    help = ('Export a signed offline verification bundle of all valid certificates '
+            '(or only the changes since the last export with --delta)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delta', action='store_true', help='Only changes since the previous export')
+        parser.add_argument('--chunk-size', type=int, help='Rows fetched per database round trip')
+        parser.add_argument('--output', help='Also copy the bundle and its .sig file to this directory')
+        parser.add_argument('--check', metavar='BUNDLE', help='Verify BUNDLE against BUNDLE.sig and exit')
+        parser.add_argument('--public-key', help='Public key (PEM) used by --check for Ed25519 signatures')
+        parser.add_argument('--generate-key', metavar='PATH',
+                            help='Create an Ed25519 signing key at PATH and print its public key')
+
+    def handle(self, *args, **options):
+        if options['generate_key']:
+            public_key = generate_signing_key(options['generate_key'])
+            self.stdout.write(self.style.SUCCESS(f"Signing key written to {options['generate_key']}"))
+            self.stdout.write('Set VERIFICATION_BUNDLE_SIGNING_KEY to that path and share this public key:')
+            self.stdout.write(public_key)
+            return
+
+        if options['check']:
+            self.check_bundle(options['check'], options['public_key'])
+            return
+
+        try:
+            export = export_verification_bundle(delta=options['delta'], chunk_size=options['chunk_size'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {export.certificate_count} certificates"
+            + (f" and {export.revoked_count} revocations" if export.is_delta else '')
+        ))
+        self.stdout.write(f"  Bundle:    {export.file.path}")
+        self.stdout.write(f"  Signature: {export.signature_file.path}")
+
+        if options['output']:
+            output = Path(options['output'])
+            output.mkdir(parents=True, exist_ok=True)
+            for field in (export.file, export.signature_file):
+                shutil.copy(field.path, output / Path(field.name).name)
+            self.stdout.write(f"  Copied to {output}")
+
+    def check_bundle(self, bundle_path, public_key_path):
+        signature_path = Path(f"{bundle_path}.sig")
+        if not signature_path.exists():
+            raise CommandError(f"Signature file not found: {signature_path}")
+
+        signature = json.loads(signature_path.read_text())
+        public_key = Path(public_key_path).read_bytes() if public_key_path else None
+        with open(bundle_path, 'rb') as bundle:
+            valid = verify_bundle_signature(bundle, signature, public_key)
+
+        if valid:
+            self.stdout.write(self.style.SUCCESS(f"Valid {signature['algorithm']} signature"))
+        else:
+            raise CommandError('Invalid signature: the bundle was modified or signed with another key')
@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from certificates.audit import rollup_verification_events
+from certificates.models import VerificationEvent
+
+
+class Command(BaseCommand):
+    help = 'Roll up verification events into daily per-certificate counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Events processed per transaction')
+        parser.add_argument('--purge-days', type=int,
+                            help='Delete rolled-up events older than this many days')
+
+    def handle(self, *args, **options):
+        processed = rollup_verification_events(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {processed} verification events'))
+
+        if options['purge_days'] is not None:
+            cutoff = timezone.now() - timedelta(days=options['purge_days'])
+            deleted, _ = VerificationEvent.objects.filter(rolled_up=True, verified_at__lt=cutoff).delete()
+            self.stdout.write(f'Deleted {deleted} events older than {options["purge_days"]} days')
@@ -0,0 +1,133 @@
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, transaction
+from django.test import Client
+from certificates.models import CertificateTemplate, CoursesHistory, GeneratedCertificate
+
+STRESS_PREFIX = 'STRESS'
+
+
+class Command(BaseCommand):
+    help = ('Stress test: run a course import and concurrent public requests at the same time '
+            'and report "database is locked" failures')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000, help='Rows written by the simulated import')
+        parser.add_argument('--requests', type=int, default=200, help='Public requests sent during the import')
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent public request threads')
+        parser.add_argument('--template_id', type=int, help='Template used for certificate requests')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Database: {connection.vendor} ({connection.settings_dict['NAME']})")
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size'):
+                    cursor.execute(f"PRAGMA {pragma}")
+                    self.stdout.write(f"  {pragma} = {cursor.fetchone()[0]}")
+
+        id_docentes = list(CoursesHistory.objects.exclude(id_docente__startswith=STRESS_PREFIX)
+                           .values_list('id_docente', flat=True).distinct()[:50])
+        if not id_docentes:
+            self.stdout.write(self.style.ERROR('No course data available. Please import data first.'))
+            return
+        template_id = options['template_id'] or CertificateTemplate.objects.values_list('id', flat=True).first()
+
+        outcomes = Counter()
+        import_done = threading.Event()
+        import_result = {}
+
+        import_thread = threading.Thread(
+            target=self.run_import, args=(options['rows'], import_result, import_done))
+        started = time.perf_counter()
+        import_thread.start()
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for outcome in executor.map(
+                    lambda _: self.public_request(random.choice(id_docentes), template_id),
+                    range(options['requests'])):
+                outcomes[outcome] += 1
+
+        import_thread.join()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f"\nElapsed: {elapsed:.2f}s")
+        if import_result.get('error'):
+            self.stdout.write(self.style.ERROR(f"Import failed: {import_result['error']}"))
+        else:
+            self.stdout.write(f"Import: {import_result['rows']} rows in {import_result['elapsed']:.2f}s")
+        for outcome, count in sorted(outcomes.items()):
+            self.stdout.write(f"  {outcome}: {count}")
+
+        locked = sum(count for outcome, count in outcomes.items() if 'locked' in outcome)
+        if locked or 'locked' in import_result.get('error', ''):
+            self.stdout.write(self.style.ERROR(f"'database is locked' errors: {locked}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("No 'database is locked' errors"))
+
+        self.cleanup()
+
+    def run_import(self, rows, result, done):
+        """Write synthetic rows the same way import_from_excel does: one transaction, update_or_create"""
+        started = time.perf_counter()
+        try:
+            with transaction.atomic():
+                for i in range(rows):
+                    CoursesHistory.objects.update_or_create(
+                        id_docente=f"{STRESS_PREFIX}{i % 100:03d}",
+                        nrc=f"{i:05d}"[-5:],
+                        periodo='209925',
+                        defaults={
+                            'profesor': f"Profesor Stress {i % 100}",
+                            'materia': f"Materia {i}",
+                            'clave': f"STR{i}",
+                            'fecha_inicio': date(2099, 1, 15),
+                            'fecha_fin': date(2099, 5, 15),
+                            'hr_cont': 60,
+                        }
+                    )
+            result['rows'] = rows
+        except Exception as e:
+            result['error'] = str(e)
+        finally:
+            result['elapsed'] = time.perf_counter() - started
+            connections.close_all()
+            done.set()
+
+    def public_request(self, id_docente, template_id):
+        """Send one public request (verification, listing or certificate) and classify the outcome"""
+        client = Client(SERVER_NAME='localhost')
+        kind = random.choices(['verify', 'professors', 'certificate'], weights=[6, 2, 2])[0]
+        try:
+            if kind == 'verify':
+                response = client.get('/api/certificates/verify-public/', {'code': f"{random.getrandbits(128):032x}"})
+                ok = response.status_code == 404
+            elif kind == 'professors':
+                response = client.get('/api/certificates/professors-public/')
+                ok = response.status_code == 200
+            else:
+                response = client.post('/api/certificates/request-public/', {
+                    'id_docente': id_docente,
+                    'template_id': template_id,
+                    'destinatario': 'A QUIEN CORRESPONDA (STRESS)',
+                })
+                ok = response.status_code == 201
+                if not ok:
+                    return f"{kind} error: {response.json().get('error', response.status_code)}"
+            return f"{kind} ok" if ok else f"{kind} error: HTTP {response.status_code}"
+        except Exception as e:
+            return f"{kind} error: {e}"
+        finally:
+            connections.close_all()
+
+    def cleanup(self):
+        CoursesHistory.objects.filter(id_docente__startswith=STRESS_PREFIX).delete()
+        for certificate in GeneratedCertificate.objects.filter(
+                metadata__destinatario='A QUIEN CORRESPONDA (STRESS)'):
+            certificate.file.delete(save=False)
+            certificate.delete()
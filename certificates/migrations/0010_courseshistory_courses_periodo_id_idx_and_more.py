@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-19 11:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0009_remove_certificatetemplate_background_pdf_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='courseshistory',
+            index=models.Index(fields=['periodo', 'id'], name='courses_periodo_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='generatedcertificate',
+            index=models.Index(fields=['-generated_at', '-id'], name='gencert_generated_at_id_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-19 11:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0011_revokedcertificate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CertificateVerificationCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('certificate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='verification_counts', to='certificates.generatedcertificate')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('certificate', 'date'), name='unique_verification_count_per_day')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VerificationEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('verification_code', models.CharField(max_length=64)),
+                ('result', models.CharField(choices=[('valid', 'Válido'), ('revoked', 'Revocado'), ('not_found', 'No encontrado'), ('invalid', 'Firma inválida')], max_length=10)),
+                ('channel', models.CharField(choices=[('public', 'Verificación pública'), ('batch', 'Verificación por lote'), ('api', 'API autenticada')], max_length=10)),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True)),
+                ('user_agent', models.CharField(blank=True, max_length=200)),
+                ('verified_at', models.DateTimeField()),
+                ('rolled_up', models.BooleanField(default=False)),
+                ('certificate', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='verification_events', to='certificates.generatedcertificate')),
+            ],
+            options={
+                'ordering': ['-verified_at'],
+                'indexes': [models.Index(fields=['rolled_up', 'id'], name='verifevent_rolled_up_idx'), models.Index(fields=['verification_code'], name='verifevent_code_idx')],
+            },
+        ),
+    ]
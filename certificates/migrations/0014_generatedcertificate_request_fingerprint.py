@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0013_verificationbundleexport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generatedcertificate',
+            name='request_fingerprint',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-19 11:41
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0014_generatedcertificate_request_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CertificateJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('pending', 'En cola'), ('running', 'Generando'), ('done', 'Terminado'), ('failed', 'Fallido')], default='pending', max_length=10)),
+                ('id_docente', models.CharField(max_length=9)),
+                ('options', models.JSONField(default=dict)),
+                ('reused', models.BooleanField(default=False)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('certificate', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='certificates.generatedcertificate')),
+                ('template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='certificates.certificatetemplate')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
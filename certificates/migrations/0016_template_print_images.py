@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-19 12:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0015_certificatejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='certificatetemplate',
+            name='background_print',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='certificate_print/'),
+        ),
+        migrations.AddField(
+            model_name='certificatetemplate',
+            name='logo_print',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='certificate_print/'),
+        ),
+        migrations.AddField(
+            model_name='certificatetemplate',
+            name='signature_print',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='certificate_print/'),
+        ),
+    ]
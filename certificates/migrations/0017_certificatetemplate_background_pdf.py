@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 12:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0016_template_print_images'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='certificatetemplate',
+            name='background_pdf',
+            field=models.FileField(blank=True, help_text='Hoja membretada en PDF; su primera página se dibuja bajo cada página del certificado', null=True, upload_to='certificate_pdf_templates/'),
+        ),
+    ]
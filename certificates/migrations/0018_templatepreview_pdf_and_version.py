@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-19 12:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0017_certificatetemplate_background_pdf'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='templatepreview',
+            name='preview_pdf',
+            field=models.FileField(blank=True, null=True, upload_to='template_previews/'),
+        ),
+        migrations.AddField(
+            model_name='templatepreview',
+            name='template_version',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2 on 2026-10-19 12:25
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_generated_at(apps, schema_editor):
+    # Until now a code only changed when its certificate was issued
+    GeneratedCertificate = apps.get_model('certificates', 'GeneratedCertificate')
+    GeneratedCertificate.objects.update(code_changed_at=F('generated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0018_templatepreview_pdf_and_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RetiredVerificationCode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=64)),
+                ('reason', models.CharField(choices=[('replaced', 'Reemplazado al regenerar'), ('deleted', 'Certificado eliminado')], max_length=10)),
+                ('retired_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'ordering': ['-retired_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='generatedcertificate',
+            name='code_changed_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.RunPython(copy_generated_at, migrations.RunPython.noop),
+    ]
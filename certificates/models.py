@@ -1,6 +1,10 @@
 # certificates/models.py
+import uuid
+
 from django.db import models
+from django.utils import timezone
 from core.models import CustomUser
+from .template_images import IMAGE_VARIANTS, print_variant
 
 
 class CertificateTemplate(models.Model):
@@ -21,6 +25,17 @@ class CertificateTemplate(models.Model):
     logo = models.ImageField(upload_to='certificate_logos/', null=True, blank=True)
     signature = models.ImageField(upload_to='certificate_signatures/', null=True, blank=True)
     background_image = models.ImageField(upload_to='certificate_backgrounds/', null=True, blank=True)
+    background_pdf = models.FileField(
+        upload_to='certificate_pdf_templates/',
+        null=True,
+        blank=True,
+        help_text="Hoja membretada en PDF; su primera página se dibuja bajo cada página del certificado"
+    )
+
+    # The images above resampled for print (template_images.py), built on upload
+    logo_print = models.ImageField(upload_to='certificate_print/', null=True, blank=True, editable=False)
+    signature_print = models.ImageField(upload_to='certificate_print/', null=True, blank=True, editable=False)
+    background_print = models.ImageField(upload_to='certificate_print/', null=True, blank=True, editable=False)
 
     # Header Information
     department_name = models.CharField(max_length=200, default="Facultad de Ciencias Físico Matemáticas")
@@ -115,10 +130,21 @@ class CertificateTemplate(models.Model):
     class Meta:
         ordering = ['-is_default', '-created_at']
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Image names as loaded, to tell which ones a save replaces
+        instance._loaded_images = {
+            name: str(instance.__dict__[name] or '') for name in IMAGE_VARIANTS if name in instance.__dict__
+        }
+        return instance
+
     def save(self, *args, **kwargs):
         # Ensure only one default template
         if self.is_default:
             CertificateTemplate.objects.filter(is_default=True).update(is_default=False)
+        loaded = getattr(self, '_loaded_images', {})
+        changed = [name for name in IMAGE_VARIANTS if getattr(self, name).name != loaded.get(name)]
         super().save(*args, **kwargs)
 
         # Set default table fields if empty
@@ -126,6 +152,35 @@ class CertificateTemplate(models.Model):
             self.table_fields = ['periodo', 'materia', 'clave', 'nrc', 'fecha_inicio', 'fecha_fin', 'hr_cont']
             super().save(update_fields=['table_fields'])
 
+        if changed:
+            self.build_print_images(changed)
+
+    def build_print_images(self, names):
+        """(Re)build the print variants of the given image fields.
+
+        Stored with a queryset update so updated_at, and with it the
+        template version in verification codes, does not change.
+        """
+        updates = {}
+        for name in names:
+            variant_name, size = IMAGE_VARIANTS[name]
+            source, variant = getattr(self, name), getattr(self, variant_name)
+            if variant:
+                variant.delete(save=False)
+            if source:
+                variant.save(*print_variant(source, size), save=False)
+            updates[variant_name] = variant.name or None
+        CertificateTemplate.objects.filter(pk=self.pk).update(**updates)
+        self._loaded_images = {name: getattr(self, name).name for name in IMAGE_VARIANTS}
+
+    def print_image_path(self, name):
+        """Path of the image the renderer draws for image field name: its print variant"""
+        variant_name = IMAGE_VARIANTS[name][0]
+        if not getattr(self, variant_name):
+            # Templates uploaded before variants existed get theirs on first use
+            self.build_print_images([name])
+        return getattr(self, variant_name).path
+
     def __str__(self):
         return f"{self.name} {'(Default)' if self.is_default else ''}"
 
@@ -177,6 +232,9 @@ class TemplatePreview(models.Model):
     """Store template previews for quick loading"""
     template = models.OneToOneField(CertificateTemplate, on_delete=models.CASCADE)
     preview_image = models.ImageField(upload_to='template_previews/', null=True, blank=True)
+    preview_pdf = models.FileField(upload_to='template_previews/', null=True, blank=True)
+    # get_template_version() of the template the preview was rendered from
+    template_version = models.BigIntegerField(default=0)
     generated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
@@ -189,11 +247,21 @@ class GeneratedCertificate(models.Model):
     template = models.ForeignKey(CertificateTemplate, on_delete=models.CASCADE)
     verification_code = models.CharField(max_length=64, unique=True)
     generated_at = models.DateTimeField(auto_now_add=True)
+    # When verification_code got its current value; a re-render replaces the
+    # code in place, so delta verification bundles select on this
+    code_changed_at = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
     file = models.FileField(upload_to='generated_certificates/')
     metadata = models.JSONField(default=dict)  # Store generation parameters
+    # Hash of the parameters and course data the PDF was rendered from; used
+    # to hand out a recent identical certificate instead of rendering again
+    request_fingerprint = models.CharField(max_length=64, blank=True, db_index=True)
 
     class Meta:
         ordering = ['-generated_at']
+        indexes = [
+            # Keyset pagination of the certificate list (newest first)
+            models.Index(fields=['-generated_at', '-id'], name='gencert_generated_at_id_idx'),
+        ]
 
     def __str__(self):
         if self.professor:
@@ -204,6 +272,150 @@ class GeneratedCertificate(models.Model):
             return f"Certificate for {professor_name} - {self.generated_at}"
 
 
+class RevokedCertificate(models.Model):
+    """Revocation of a generated certificate; the record and PDF are kept"""
+    certificate = models.OneToOneField(GeneratedCertificate, on_delete=models.CASCADE, related_name='revocation')
+    reason = models.TextField(blank=True)
+    revoked_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True)
+    revoked_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-revoked_at']
+
+    def __str__(self):
+        return f"Revocation of certificate {self.certificate_id}"
+
+
+class RetiredVerificationCode(models.Model):
+    """A verification code that stopped being valid without a revocation"""
+    REASON_REPLACED = 'replaced'
+    REASON_DELETED = 'deleted'
+    REASON_CHOICES = (
+        (REASON_REPLACED, 'Reemplazado al regenerar'),
+        (REASON_DELETED, 'Certificado eliminado'),
+    )
+    code = models.CharField(max_length=64)
+    reason = models.CharField(max_length=10, choices=REASON_CHOICES)
+    retired_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['-retired_at']
+
+    def __str__(self):
+        return f"{self.code} ({self.get_reason_display()})"
+
+
+class CertificateJob(models.Model):
+    """Certificate request rendered in the background (202 Accepted mode)"""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'En cola'),
+        (STATUS_RUNNING, 'Generando'),
+        (STATUS_DONE, 'Terminado'),
+        (STATUS_FAILED, 'Fallido'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    id_docente = models.CharField(max_length=9)
+    template = models.ForeignKey(CertificateTemplate, on_delete=models.CASCADE)
+    options = models.JSONField(default=dict)
+    certificate = models.ForeignKey(GeneratedCertificate, on_delete=models.SET_NULL, null=True, blank=True)
+    reused = models.BooleanField(default=False)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Job {self.id} ({self.status}) for {self.id_docente}"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+
+class VerificationBundleExport(models.Model):
+    """Signed offline verification bundle (full or delta since the previous export)"""
+    file = models.FileField(upload_to='verification_bundles/')
+    signature_file = models.FileField(upload_to='verification_bundles/')
+    is_delta = models.BooleanField(default=False)
+    # Exports of a hand-picked selection are not a baseline for deltas
+    is_partial = models.BooleanField(default=False)
+    since = models.DateTimeField(null=True, blank=True)
+    until = models.DateTimeField()
+    certificate_count = models.PositiveIntegerField(default=0)
+    revoked_count = models.PositiveIntegerField(default=0)
+    created_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        kind = 'Delta' if self.is_delta else 'Partial' if self.is_partial else 'Full'
+        return f"{kind} bundle until {self.until:%Y-%m-%d %H:%M} ({self.certificate_count} certificates)"
+
+
+class VerificationEvent(models.Model):
+    """One verification of a code; written in batches by certificates.audit"""
+    RESULT_CHOICES = (
+        ('valid', 'Válido'),
+        ('revoked', 'Revocado'),
+        ('not_found', 'No encontrado'),
+        ('invalid', 'Firma inválida'),
+    )
+    CHANNEL_CHOICES = (
+        ('public', 'Verificación pública'),
+        ('batch', 'Verificación por lote'),
+        ('api', 'API autenticada'),
+    )
+
+    verification_code = models.CharField(max_length=64)
+    # No database constraint: events are bulk inserted and may outlive the certificate
+    certificate = models.ForeignKey(GeneratedCertificate, on_delete=models.SET_NULL, null=True, blank=True,
+                                    db_constraint=False, related_name='verification_events')
+    result = models.CharField(max_length=10, choices=RESULT_CHOICES)
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    user_agent = models.CharField(max_length=200, blank=True)
+    verified_at = models.DateTimeField()
+    rolled_up = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['-verified_at']
+        indexes = [
+            models.Index(fields=['rolled_up', 'id'], name='verifevent_rolled_up_idx'),
+            models.Index(fields=['verification_code'], name='verifevent_code_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.verification_code} ({self.result}) - {self.verified_at}"
+
+
+class CertificateVerificationCount(models.Model):
+    """Daily verification counter per certificate, rolled up from VerificationEvent"""
+    certificate = models.ForeignKey(GeneratedCertificate, on_delete=models.CASCADE,
+                                    related_name='verification_counts')
+    date = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['certificate', 'date'], name='unique_verification_count_per_day'),
+        ]
+
+    def __str__(self):
+        return f"Certificate {self.certificate_id}: {self.count} on {self.date}"
+
+
 class CoursesHistory(models.Model):
     """Enhanced model to store professor's course history data"""
     # Core required fields
@@ -251,6 +463,10 @@ class CoursesHistory(models.Model):
         ordering = ['periodo', 'materia']
         # Unique constraint to prevent duplicates
         unique_together = ['id_docente', 'nrc', 'periodo']
+        indexes = [
+            # Keyset pagination of the course history list
+            models.Index(fields=['periodo', 'id'], name='courses_periodo_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.profesor} - {self.materia} ({self.periodo})"
@@ -0,0 +1,221 @@
+# certificates/pagination.py
+import base64
+import datetime
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def estimate_count(queryset):
+    """Cheap row count estimate from the PostgreSQL planner, or None if unavailable"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder without its truncation of datetimes and times to milliseconds.
+
+    A cursor must hold the exact key of the last row, or rows whose keys
+    differ only in the microseconds would be skipped.
+    """
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination on a composite, indexed sort key.
+
+    Pages are fetched with ``WHERE (key) > (last key seen) ORDER BY key
+    LIMIT n``, so the cost per page does not grow with depth and no
+    ``COUNT(*)`` runs unless the client asks for one with ``?count=exact``
+    or ``?count=estimate``. The last field of ``ordering`` must be unique.
+    """
+    ordering = ('-id',)
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Cursor inválido'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        self.reverse = bool(cursor and cursor.get('r'))
+
+        self.count = self.get_count(queryset, request)
+
+        ordering = self.ordering
+        if self.reverse:
+            ordering = tuple(self._invert(field) for field in ordering)
+        queryset = queryset.order_by(*ordering)
+        if cursor:
+            values = self.cursor_values(queryset, ordering, cursor['v'])
+            queryset = queryset.filter(self.keyset_filter(ordering, values))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+
+        # Going forward there is a previous page whenever a cursor was used;
+        # going backward there is always a next page (the one we came from)
+        self.has_next = has_more if not self.reverse else True
+        self.has_previous = bool(cursor) if not self.reverse else has_more
+        self.first_key = self.get_key(rows[0]) if rows else None
+        self.last_key = self.get_key(rows[-1]) if rows else None
+        return rows
+
+    def get_paginated_response(self, data):
+        response_data = OrderedDict()
+        if self.count is not None:
+            response_data['count'] = self.count
+        response_data['next'] = self.get_next_link()
+        response_data['previous'] = self.get_previous_link()
+        response_data['results'] = data
+        return Response(response_data)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer'},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param)
+        if mode == 'exact':
+            return queryset.count()
+        if mode == 'estimate':
+            estimate = estimate_count(queryset)
+            return estimate if estimate is not None else queryset.count()
+        return None
+
+    def get_next_link(self):
+        if not self.has_next or self.last_key is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   self.encode_cursor({'v': self.last_key}))
+
+    def get_previous_link(self):
+        if not self.has_previous or self.first_key is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   self.encode_cursor({'v': self.first_key, 'r': 1}))
+
+    def cursor_values(self, queryset, ordering, values):
+        """Parse the key decoded from a cursor back into the ordering fields' types"""
+        if len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            return [
+                queryset.model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(ordering, values)
+            ]
+        except (TypeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def keyset_filter(self, ordering, values):
+        """Build the row-value comparison (a, b) > (x, y) as nested Q objects"""
+        if len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        condition = Q()
+        for position in range(len(ordering) - 1, -1, -1):
+            field = ordering[position].lstrip('-')
+            lookup = 'lt' if ordering[position].startswith('-') else 'gt'
+            step = Q(**{f"{field}__{lookup}": values[position]})
+            if position < len(ordering) - 1:
+                step |= Q(**{field: values[position]}) & condition
+            condition = step
+        return condition
+
+    def get_key(self, row):
+        fields = [field.lstrip('-') for field in self.ordering]
+        if isinstance(row, dict):
+            return [row[field] for field in fields]
+        return [getattr(row, field) for field in fields]
+
+    def encode_cursor(self, cursor):
+        raw = json.dumps(cursor, cls=CursorEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+            cursor = json.loads(raw)
+            if not isinstance(cursor, dict) or not isinstance(cursor.get('v'), list):
+                raise ValueError
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    @staticmethod
+    def _invert(field):
+        return field[1:] if field.startswith('-') else f"-{field}"
+
+
+class CoursesHistoryPagination(KeysetPagination):
+    """Keyset pagination for course history, backed by the (periodo, id) index"""
+    ordering = ('periodo', 'id')
+
+
+class GeneratedCertificatePagination(KeysetPagination):
+    """Keyset pagination for certificates, newest first on the (generated_at, id) index"""
+    ordering = ('-generated_at', '-id')
+
+
+class EstimatedCountPaginator(Paginator):
+    """Admin paginator that trusts the planner estimate for large result sets.
+
+    Exact ``COUNT(*)`` is only run when the estimate is below
+    ``exact_count_threshold`` (or the database cannot estimate).
+    """
+    exact_count_threshold = 10000
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is not None and estimate >= self.exact_count_threshold:
+            return estimate
+        return super().count
@@ -0,0 +1,112 @@
+# certificates/previews.py
+"""Sample certificates of a template, stored in TemplatePreview.
+
+A preview is rendered in a Celery task when a template is saved (see
+signals.py) from fictitious sample courses, so it can be shown publicly.
+It is kept until the template's updated_at changes. The PNG thumbnail of
+the first page needs PyMuPDF; without it only the PDF is stored.
+"""
+from datetime import date, datetime
+
+from django.core.files.base import ContentFile
+
+from .course_loader import CourseRecord, ProfessorCourses
+from .models import TemplatePreview
+from .services import CertificateService
+from .verification import get_template_version
+
+try:
+    import pymupdf
+
+    PYMUPDF_AVAILABLE = True
+except ImportError:
+    PYMUPDF_AVAILABLE = False
+
+THUMBNAIL_DPI = 60
+
+SAMPLE_ID_DOCENTE = '000000000'
+SAMPLE_PROFESSOR = 'APELLIDO - APELLIDO NOMBRE DE MUESTRA'
+SAMPLE_VERIFICATION_CODE = 'MUESTRA'
+
+
+def sample_courses():
+    """A short fictitious course history, with one cross-listed group"""
+    rows = [
+        ('202425', 'Calculo Diferencial', 'MATS 001', '20001', date(2024, 1, 15), date(2024, 5, 17), 60, None),
+        ('202425', 'Algebra Lineal I', 'MATS 005', '20002', date(2024, 1, 15), date(2024, 5, 17), 60, 'L1'),
+        ('202425', 'Algebra Lineal', 'ACTS 005', '20003', date(2024, 1, 15), date(2024, 5, 17), 60, 'L1'),
+        ('202435', 'Calculo Integral', 'MATS 008', '20004', date(2024, 8, 12), date(2024, 12, 6), 60, None),
+        ('202435', 'Geometria Analitica', 'MATS 003', '20005', date(2024, 8, 12), date(2024, 12, 6), 45, None),
+    ]
+    groups = {}
+    for row in rows:
+        if row[7]:
+            size, hours = groups.get((row[0], row[7]), (0, 0))
+            groups[row[0], row[7]] = (size + 1, hours + row[6])
+    return ProfessorCourses(
+        CourseRecord(
+            id, SAMPLE_PROFESSOR, periodo, materia, clave, nrc, fecha_inicio, fecha_fin, hr_cont, listas_cruzadas,
+            datetime(2024, 1, 1), *groups.get((periodo, listas_cruzadas), (1, hr_cont))
+        )
+        for id, (periodo, materia, clave, nrc, fecha_inicio, fecha_fin, hr_cont, listas_cruzadas)
+        in enumerate(rows, start=1)
+    )
+
+
+def current_preview(template):
+    """The template's stored preview if it was rendered from its current version, else None"""
+    try:
+        preview = template.templatepreview
+    except TemplatePreview.DoesNotExist:
+        return None
+    if preview and preview.preview_pdf and preview.template_version == get_template_version(template):
+        return preview
+    return None
+
+
+def preview_urls(template):
+    """URLs of the current preview PDF and thumbnail of template (None when missing)"""
+    preview = current_preview(template)
+    return {
+        'preview_pdf': preview.preview_pdf.url if preview else None,
+        'preview_image': preview.preview_image.url if preview and preview.preview_image else None,
+    }
+
+
+def render_template_preview(template):
+    """Render and store the preview of template unless the stored one is current.
+
+    Returns (preview, rendered).
+    """
+    preview = current_preview(template)
+    if preview:
+        return preview, False
+
+    version = get_template_version(template)
+    options = {
+        'destinatario': template.recipient_line,
+        'incluir_qr': template.include_qr_by_default,
+        'verification_code': SAMPLE_VERIFICATION_CODE,
+    }
+    if template.table_fields:
+        options['campos'] = template.table_fields
+    pdf_content, _ = CertificateService.generate_pdf(
+        id_docente=SAMPLE_ID_DOCENTE,
+        courses=sample_courses(),
+        template=template,
+        options=options
+    )
+    pdf = pdf_content.read()
+
+    preview, _ = TemplatePreview.objects.get_or_create(template=template)
+    for field in (preview.preview_pdf, preview.preview_image):
+        if field:
+            field.delete(save=False)
+    preview.preview_pdf.save(f"template_{template.id}_{version}.pdf", ContentFile(pdf), save=False)
+    if PYMUPDF_AVAILABLE:
+        with pymupdf.open(stream=pdf, filetype='pdf') as document:
+            thumbnail = document[0].get_pixmap(dpi=THUMBNAIL_DPI).tobytes('png')
+        preview.preview_image.save(f"template_{template.id}_{version}.png", ContentFile(thumbnail), save=False)
+    preview.template_version = version
+    preview.save()
+    return preview, True
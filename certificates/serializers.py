@@ -1,5 +1,10 @@
 # certificates/serializers.py
+import csv
+import io
+from datetime import date, datetime
+from django.conf import settings
 from rest_framework import serializers
+from .course_loader import load_professor_courses
 from .models import CertificateTemplate, GeneratedCertificate, CoursesHistory
 
 
@@ -28,12 +33,73 @@ class GeneratedCertificateSerializer(serializers.ModelSerializer):
         return obj.metadata.get('id_docente', '')
 
 
-class CoursesHistorySerializer(serializers.ModelSerializer):
+def parse_sparse_fields(request, available):
+    """Return the field names selected with ?fields=a,b and/or ?omit=c,d, in model order"""
+    selected = list(available)
+    if request is None:
+        return selected
+
+    fields = request.query_params.get('fields')
+    if fields:
+        requested = {name.strip() for name in fields.split(',')}
+        selected = [name for name in selected if name in requested]
+
+    omit = request.query_params.get('omit')
+    if omit:
+        omitted = {name.strip() for name in omit.split(',')}
+        selected = [name for name in selected if name not in omitted]
+
+    return selected or ['id']
+
+
+class SparseFieldsetsMixin:
+    """Drop fields not selected with ?fields= / ?omit= on read requests"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+        keep = set(parse_sparse_fields(request, self.fields.keys()))
+        for name in list(self.fields):
+            if name not in keep:
+                self.fields.pop(name)
+
+
+class CoursesHistorySerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     class Meta:
         model = CoursesHistory
         fields = '__all__'
 
 
+COURSES_HISTORY_FIELDS = [field.attname for field in CoursesHistory._meta.concrete_fields]
+
+
+class CoursesHistoryListSerializer(serializers.BaseSerializer):
+    """Lean read-only serializer for course history lists.
+
+    Expects ``.values()`` rows restricted to the sparse fieldset and only
+    converts dates, instead of building a DRF field per column and row.
+    """
+    datetime_field = serializers.DateTimeField()
+
+    def get_selected_fields(self):
+        if not hasattr(self, '_selected_fields'):
+            self._selected_fields = parse_sparse_fields(self.context.get('request'), COURSES_HISTORY_FIELDS)
+        return self._selected_fields
+
+    def to_representation(self, row):
+        data = {}
+        for name in self.get_selected_fields():
+            value = row[name]
+            if isinstance(value, datetime):
+                value = self.datetime_field.to_representation(value)
+            elif isinstance(value, date):
+                value = value.isoformat()
+            data[name] = value
+        return data
+
+
 class GenerateCertificateSerializer(serializers.Serializer):
     """Simplified serializer for certificate generation using only id_docente"""
     id_docente = serializers.CharField(
@@ -74,8 +140,12 @@ class GenerateCertificateSerializer(serializers.Serializer):
         return None
 
     def validate_id_docente(self, value):
-        """Validate that the id_docente exists in course history"""
-        if not CoursesHistory.objects.filter(id_docente=value).exists():
+        """Validate that the id_docente exists in course history.
+
+        The courses are loaded for the whole request (see course_loader),
+        so the view renders from the same rows without querying again.
+        """
+        if not load_professor_courses(value, self.context.get('request')).exists():
             raise serializers.ValidationError(
                 f"No se encontraron cursos para el ID docente: {value}"
             )
@@ -102,6 +172,49 @@ class VerifyCertificateSerializer(serializers.Serializer):
     verification_code = serializers.CharField(required=True)
 
 
+class BatchVerifyCertificateSerializer(serializers.Serializer):
+    """Serializer for batch verification: a list of codes and/or a CSV file"""
+    codes = serializers.ListField(child=serializers.CharField(), required=False)
+    file = serializers.FileField(required=False, help_text="CSV con un código por fila (primera columna)")
+
+    CSV_HEADERS = ('code', 'codigo', 'código', 'verification_code')
+
+    def validate_file(self, value):
+        if value.size > settings.VERIFY_BATCH_MAX_UPLOAD_SIZE:
+            raise serializers.ValidationError(
+                f"El archivo excede el tamaño máximo de {settings.VERIFY_BATCH_MAX_UPLOAD_SIZE} bytes"
+            )
+        return value
+
+    def validate(self, attrs):
+        codes = list(attrs.get('codes') or [])
+        if attrs.get('file'):
+            codes.extend(self.read_csv_codes(attrs['file']))
+
+        # Drop blanks and duplicates, keeping the order of the request
+        codes = list(dict.fromkeys(code.strip() for code in codes if code and code.strip()))
+        if not codes:
+            raise serializers.ValidationError("Debe enviar al menos un código de verificación")
+        if len(codes) > settings.VERIFY_BATCH_MAX_CODES:
+            raise serializers.ValidationError(
+                f"Máximo {settings.VERIFY_BATCH_MAX_CODES} códigos por solicitud (recibidos: {len(codes)})"
+            )
+
+        attrs['codes'] = codes
+        return attrs
+
+    def read_csv_codes(self, uploaded_file):
+        try:
+            text = uploaded_file.read().decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise serializers.ValidationError({'file': "El archivo debe ser un CSV en UTF-8"})
+
+        codes = [row[0] for row in csv.reader(io.StringIO(text)) if row]
+        if codes and codes[0].strip().lower() in self.CSV_HEADERS:
+            codes = codes[1:]
+        return codes
+
+
 class ProfessorListSerializer(serializers.Serializer):
     """Serializer for listing available professors from course history"""
     id_docente = serializers.CharField()
@@ -121,6 +234,11 @@ class BulkGenerateSerializer(serializers.Serializer):
     incluir_qr = serializers.BooleanField(default=True)
     periodos_filtro = serializers.ListField(child=serializers.CharField(), required=False)
     periodo_actual = serializers.CharField(required=False)
+    output = serializers.ChoiceField(
+        choices=['files', 'merged'],
+        default='files',
+        help_text="'files': un PDF por docente; 'merged': además devuelve un solo PDF para imprimir con un marcador por docente"
+    )
 
     def validate_docente_ids(self, value):
         """Validate that all docente IDs exist"""
@@ -223,7 +341,7 @@ class EnhancedGenerateCertificateSerializer(serializers.Serializer):
                 })
 
             # Verify the professor exists
-            if not CoursesHistory.objects.filter(id_docente=data['id_docente']).exists():
+            if not load_professor_courses(data['id_docente'], self.context.get('request')).exists():
                 raise serializers.ValidationError({
                     'id_docente': f"No se encontraron cursos para el ID docente: {data['id_docente']}"
                 })
@@ -0,0 +1,45 @@
+# certificates/signals.py
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import CertificateTemplate, GeneratedCertificate, RetiredVerificationCode, RevokedCertificate
+from .tasks import PUBLISH_RETRY_POLICY, render_template_preview_task
+from .verification import PENDING_CODE_PREFIX, bump_verification_index
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=RevokedCertificate)
+@receiver(post_delete, sender=RevokedCertificate)
+@receiver(post_delete, sender=GeneratedCertificate)
+def invalidate_verification_index(sender, **kwargs):
+    """Revocations and deletions change the answer for existing codes"""
+    bump_verification_index()
+
+
+@receiver(post_delete, sender=GeneratedCertificate)
+def retire_deleted_code(sender, instance, **kwargs):
+    """Keep the code of a deleted certificate, so delta bundles can list it as no longer valid"""
+    if not instance.verification_code.startswith(PENDING_CODE_PREFIX):
+        RetiredVerificationCode.objects.create(
+            code=instance.verification_code, reason=RetiredVerificationCode.REASON_DELETED)
+
+
+@receiver(post_save, sender=CertificateTemplate)
+def queue_template_preview(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Render the preview of a changed template in the background once it is committed"""
+    # CertificateTemplate.save() stores default table_fields in a second
+    # save; the preview queued by the first one already covers it
+    if raw or update_fields == frozenset({'table_fields'}):
+        return
+
+    def queue():
+        try:
+            render_template_preview_task.apply_async((instance.pk,), retry_policy=PUBLISH_RETRY_POLICY)
+        except Exception as e:
+            logger.error(f"Could not queue preview of template {instance.pk}: {e}")
+
+    transaction.on_commit(queue)
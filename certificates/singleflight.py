@@ -0,0 +1,45 @@
+# certificates/singleflight.py
+"""Run an expensive computation once per key, across threads and processes.
+
+The first caller takes a lock in the cache and computes the value; callers
+arriving meanwhile wait for the value to appear instead of computing it
+too. The value stays in the cache for CERTIFICATE_SINGLE_FLIGHT_RESULT_SECONDS
+so a burst of requests shortly after also shares it.
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+POLL_INTERVAL = 0.05
+
+
+def single_flight(key, compute):
+    result_key = f"singleflight:{key}:result"
+    lock_key = f"singleflight:{key}:lock"
+    deadline = time.monotonic() + settings.CERTIFICATE_SINGLE_FLIGHT_WAIT
+
+    while True:
+        result = cache.get(result_key)
+        if result is not None:
+            return result
+
+        if cache.add(lock_key, uuid.uuid4().hex, settings.CERTIFICATE_SINGLE_FLIGHT_WAIT):
+            try:
+                # The previous holder may have stored the result and released
+                # the lock since we looked
+                result = cache.get(result_key)
+                if result is not None:
+                    return result
+                result = compute()
+                cache.set(result_key, result, settings.CERTIFICATE_SINGLE_FLIGHT_RESULT_SECONDS)
+                return result
+            finally:
+                cache.delete(lock_key)
+
+        # Someone else is computing it; if it takes too long (or the cache
+        # cannot hold the result) compute our own
+        if time.monotonic() >= deadline:
+            return compute()
+        time.sleep(POLL_INTERVAL)
@@ -0,0 +1,64 @@
+# certificates/table_cells.py
+"""Cells of the certificate's course table.
+
+Measuring text is most of what ReportLab does when it lays out a table:
+a Paragraph cell re-parses its markup and re-measures its words on every
+wrap, and again after each page split. CellFactory measures each line
+once per process (text_width() is cached) and only builds a Paragraph
+when a line is too wide for its column; all other cells are plain
+strings, which ReportLab draws without wrapping.
+"""
+from functools import lru_cache
+from xml.sax.saxutils import escape
+
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus import Paragraph
+
+# Left plus right padding of a course table cell
+CELL_HORIZONTAL_PADDING = 12
+
+
+@lru_cache(maxsize=16384)
+def text_width(text, font_name, font_size):
+    """stringWidth(), cached: course names and codes repeat across rows and certificates"""
+    return stringWidth(text, font_name, font_size)
+
+
+@lru_cache(maxsize=None)
+def cell_style(font_name, font_size, leading):
+    """The shared ParagraphStyle of wrapped cells in this font"""
+    return ParagraphStyle(
+        f'Cell-{font_name}-{font_size}-{leading}',
+        fontName=font_name,
+        fontSize=font_size,
+        alignment=TA_CENTER,
+        leading=leading
+    )
+
+
+class CellFactory:
+    """Build course table cells drawn in font_name/font_size with the given leading.
+
+    Calling the factory with the lines of a cell and the column width
+    returns the cell value and its content height: a plain string when
+    every line fits, else a Paragraph in the shared cell_style() that
+    wraps them.
+    """
+
+    def __init__(self, font_name='Helvetica', font_size=9, leading=12):
+        self.font_name = font_name
+        self.font_size = font_size
+        self.leading = leading
+        self.style = cell_style(font_name, font_size, leading)
+
+    def fits(self, lines, width):
+        available = width - CELL_HORIZONTAL_PADDING
+        return all(text_width(line, self.font_name, self.font_size) <= available for line in lines)
+
+    def __call__(self, lines, width):
+        if self.fits(lines, width):
+            return '\n'.join(lines), len(lines) * self.leading
+        paragraph = Paragraph('<br/>'.join(escape(line) for line in lines), self.style)
+        return paragraph, paragraph.wrap(width - CELL_HORIZONTAL_PADDING, 1e6)[1]
@@ -0,0 +1,73 @@
+# certificates/tasks.py
+from celery import shared_task
+from django.utils import timezone
+
+from .admission import RenderRejected
+from .audit import rollup_verification_events
+from .course_loader import ProfessorCourses
+from .models import CertificateJob, CertificateTemplate
+from .previews import render_template_preview
+from .services import CertificateService
+
+# Publishing from a request gives up after one quick retry when the broker
+# is down (Celery's default keeps reconnecting for several seconds), so
+# the caller can fall back to doing the work itself
+PUBLISH_RETRY_POLICY = {'max_retries': 1, 'interval_start': 0, 'interval_step': 0.2, 'interval_max': 0.2}
+
+
+@shared_task
+def rollup_verification_events_task():
+    """Fold buffered verification events into daily per-certificate counters"""
+    return {'processed': rollup_verification_events()}
+
+
+@shared_task(bind=True, max_retries=None, ignore_result=True)
+def render_certificate_job(self, job_id):
+    """Render the certificate of a CertificateJob (public 202 Accepted mode).
+
+    The outcome is stored in the job; with a result the call would first
+    wait on the result backend, which is unreachable whenever the broker is.
+    """
+    claimed = CertificateJob.objects.filter(id=job_id, status=CertificateJob.STATUS_PENDING).update(
+        status=CertificateJob.STATUS_RUNNING, started_at=timezone.now())
+    if not claimed:
+        # Already picked up (the broker may deliver a task twice)
+        return {'job': job_id, 'status': 'skipped'}
+
+    job = CertificateJob.objects.select_related('template').get(id=job_id)
+    courses = ProfessorCourses.load(job.id_docente)
+    try:
+        if not courses.exists():
+            raise ValueError(f'No se encontraron cursos para el ID docente: {job.id_docente}')
+        job.certificate, created = CertificateService.get_or_issue_certificate(
+            id_docente=job.id_docente,
+            courses=courses,
+            template=job.template,
+            options=job.options,
+            professor_name=courses.first().profesor
+        )
+        job.reused = not created
+        job.status = CertificateJob.STATUS_DONE
+    except RenderRejected as e:
+        # This worker is saturated; put the job back in the queue
+        CertificateJob.objects.filter(id=job_id).update(status=CertificateJob.STATUS_PENDING, started_at=None)
+        raise self.retry(countdown=e.retry_after)
+    except Exception as e:
+        job.error = str(e)
+        job.status = CertificateJob.STATUS_FAILED
+    job.finished_at = timezone.now()
+    job.save(update_fields=['certificate', 'reused', 'error', 'status', 'finished_at'])
+    return {'job': job_id, 'status': job.status}
+
+
+@shared_task(bind=True, max_retries=None, ignore_result=True)
+def render_template_preview_task(self, template_id):
+    """Render the sample certificate and thumbnail of a template into TemplatePreview"""
+    template = CertificateTemplate.objects.filter(id=template_id).first()
+    if template is None:
+        return {'template': template_id, 'status': 'deleted'}
+    try:
+        _, rendered = render_template_preview(template)
+    except RenderRejected as e:
+        raise self.retry(countdown=e.retry_after)
+    return {'template': template_id, 'status': 'rendered' if rendered else 'current'}
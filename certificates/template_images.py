@@ -0,0 +1,62 @@
+# certificates/template_images.py
+"""Print-ready variants of a template's logo, signature and background.
+
+Uploads are often multi-megabyte photos, while a certificate draws the
+logo in a 1.5 inch box and the signature in a 2 x 0.75 inch one. Each
+image gets a variant downsampled to CERTIFICATE_IMAGE_DPI for that box:
+a JPEG, which ReportLab embeds without decoding it, or a PNG when the
+image has transparency. The renderer draws the variant.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image as PILImage, ImageOps
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import inch
+
+# Source field -> (variant field, size it is drawn at in points)
+IMAGE_VARIANTS = {
+    'logo': ('logo_print', (1.5 * inch, 1.5 * inch)),
+    'signature': ('signature_print', (2 * inch, 0.75 * inch)),
+    'background_image': ('background_print', letter),
+}
+
+JPEG_QUALITY = 90
+
+
+def has_transparency(image):
+    return image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def print_variant(source, size):
+    """Return (file name, ContentFile) of source resampled for a box of size points.
+
+    The image is never upscaled; it keeps its own resolution on an axis
+    where it is already below the print resolution.
+    """
+    source.open('rb')
+    try:
+        image = ImageOps.exif_transpose(PILImage.open(source))
+        image.load()
+    finally:
+        source.close()
+
+    dpi = settings.CERTIFICATE_IMAGE_DPI
+    target = (
+        min(image.width, round(size[0] / inch * dpi)),
+        min(image.height, round(size[1] / inch * dpi)),
+    )
+    if target != image.size:
+        image = image.resize(target, PILImage.LANCZOS)
+
+    buffer = BytesIO()
+    stem = os.path.splitext(os.path.basename(source.name))[0]
+    if has_transparency(image):
+        image.convert('RGBA').save(buffer, 'PNG', optimize=True, dpi=(dpi, dpi))
+        name = f"{stem}_{dpi}dpi.png"
+    else:
+        image.convert('RGB').save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, dpi=(dpi, dpi))
+        name = f"{stem}_{dpi}dpi.jpg"
+    return name, ContentFile(buffer.getvalue())
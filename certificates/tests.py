@@ -1,5 +1,658 @@
 # certificate/tests
 
-from django.test import TestCase
+import gzip
+import hashlib
+import json
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from io import BytesIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from kombu.exceptions import OperationalError
+from PyPDF2 import PdfReader
+from reportlab.lib.units import inch
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from . import async_views, views
+from .admission import RenderAdmission, RenderRejected
+from .audit import rollup_verification_events
+from .bloom import BloomFilter
+from .bundles import (
+    CRYPTOGRAPHY_AVAILABLE,
+    export_verification_bundle,
+    generate_signing_key,
+    verify_bundle_signature,
+)
+from .course_loader import ProfessorCourses
+from .models import (
+    CertificateJob,
+    CertificateTemplate,
+    CertificateVerificationCount,
+    CoursesHistory,
+    GeneratedCertificate,
+    RevokedCertificate,
+    VerificationEvent,
+)
+from .pagination import GeneratedCertificatePagination
+from .previews import PYMUPDF_AVAILABLE, render_template_preview, sample_courses
+from .serializers import COURSES_HISTORY_FIELDS
+from .services import CertificateService
+from .singleflight import single_flight
+from .tasks import PUBLISH_RETRY_POLICY
+from .verification import (
+    CODE_ABSENT,
+    CODE_INVALID,
+    CODE_PRESENT,
+    CODE_REVOKED,
+    CODE_UNINDEXED,
+    INDEX_VERSION_KEY,
+    check_verification_code,
+    get_template_version,
+    get_verification_index,
+    make_verification_code,
+    read_verification_code,
+)
+
+
+def store_sample_courses(**fields):
+    """Store the courses of previews.sample_courses() for id_docente 100524277"""
+    for course in sample_courses():
+        CoursesHistory.objects.create(**{
+            field: value for field, value in course._asdict().items() if field in COURSES_HISTORY_FIELDS
+        }, id_docente='100524277', **fields)
+
+
+class ReadVerificationCodeTests(SimpleTestCase):
+    def test_round_trip(self):
+        code = make_verification_code(42, '100524277', date(2025, 3, 1), 1, 7)
+        payload = read_verification_code(code)
+        self.assertEqual((payload.certificate_id, payload.id_docente), (42, '100524277'))
+
+    def test_non_ascii_code_is_rejected(self):
+        self.assertIsNone(read_verification_code('c1.a.b.c.d.e.é'))
+        code = make_verification_code(42, '100524277', date(2025, 3, 1), 1, 7)
+        self.assertIsNone(read_verification_code(code[:-1] + 'é'))
+
+
+class VerificationIndexTests(TestCase):
+    def setUp(self):
+        self.template = CertificateTemplate.objects.create(name='Prueba')
+
+    def issue(self, certificate):
+        certificate.verification_code = make_verification_code(
+            certificate.id, '100524277', date(2025, 3, 1), self.template.id, get_template_version(self.template))
+        certificate.save(update_fields=['verification_code'])
+        return certificate.verification_code
+
+    def test_code_stored_after_a_rebuild_is_not_absent(self):
+        # The index is rebuilt while the certificate is still being rendered
+        certificate = GeneratedCertificate.objects.create(template=self.template, verification_code='pending-1')
+        get_verification_index(refresh=True)
+        code = self.issue(certificate)
+        self.assertEqual(check_verification_code(code).state, CODE_UNINDEXED)
+
+    def test_code_missing_from_the_snapshot_is_not_absent(self):
+        # A signed code whose record was not visible when the index was built
+        certificate = GeneratedCertificate.objects.create(template=self.template, verification_code='pending-1')
+        later = GeneratedCertificate.objects.create(template=self.template, verification_code='pending-2')
+        self.issue(later)
+        get_verification_index(refresh=True)
+        self.assertEqual(check_verification_code(self.issue(certificate)).state, CODE_UNINDEXED)
+
+    def test_revocation_not_yet_in_the_index(self):
+        certificate = GeneratedCertificate.objects.create(template=self.template, verification_code='pending-1')
+        code = self.issue(certificate)
+        get_verification_index(refresh=True)
+        self.assertEqual(check_verification_code(code).state, CODE_PRESENT)
+
+        # Revoked by another process: this index has not been rebuilt
+        RevokedCertificate.objects.create(certificate=certificate, reason='Duplicado')
+        check = check_verification_code(code)
+        self.assertEqual(check.state, CODE_REVOKED)
+        self.assertEqual(check.revocation['reason'], 'Duplicado')
+
+    def test_shared_index_answers_present_codes_without_a_query(self):
+        certificate = GeneratedCertificate.objects.create(template=self.template, verification_code='pending-1')
+        code = self.issue(certificate)
+        get_verification_index(refresh=True)
+        with mock.patch('certificates.verification.index_version_is_shared', return_value=True):
+            with self.assertNumQueries(0):
+                self.assertEqual(check_verification_code(code).state, CODE_PRESENT)
+
+    @override_settings(VERIFICATION_AUDIT_ENABLED=False)
+    def test_batch_loads_revocations_with_the_records(self):
+        codes = [
+            self.issue(GeneratedCertificate.objects.create(template=self.template, verification_code=f"pending-{n}"))
+            for n in range(3)
+        ]
+        get_verification_index(refresh=True)
+        RevokedCertificate.objects.create(certificate=GeneratedCertificate.objects.get(verification_code=codes[0]))
+
+        with self.assertNumQueries(1):
+            response = APIClient().post('/api/certificates/verify-batch-public/', {'codes': codes}, format='json')
+        self.assertEqual([result['status'] for result in response.data['results']], ['revoked', 'valid', 'valid'])
+        self.assertEqual(response.data['valid_count'], 2)
+
+    @override_settings(VERIFICATION_AUDIT_ENABLED=False)
+    def test_details_of_a_revocation_not_yet_in_the_index(self):
+        code = self.issue(GeneratedCertificate.objects.create(template=self.template, verification_code='pending-1'))
+        get_verification_index(refresh=True)
+        # Revoked by another process whose bump has not reached this index
+        RevokedCertificate.objects.create(certificate=GeneratedCertificate.objects.get(verification_code=code),
+                                          reason='Duplicado')
+
+        url = f"/api/certificates/verify-public/?code={code}&details=1"
+        with mock.patch('certificates.verification.index_version_is_shared', return_value=True), \
+                mock.patch('certificates.async_views.index_version_is_shared', return_value=True):
+            responses = [
+                APIClient().get(url).data,
+                json.loads(async_to_sync(async_views.public_verify_certificate)(RequestFactory().get(url)).content),
+            ]
+        for data in responses:
+            self.assertEqual((data['valid'], data['revoked'], data['reason']), (False, True, 'Duplicado'))
+
+    def test_index_answers_without_a_query(self):
+        present = self.issue(GeneratedCertificate.objects.create(template=self.template, verification_code='pending-1'))
+        revoked_certificate = GeneratedCertificate.objects.create(template=self.template, verification_code='pending-2')
+        revoked = self.issue(revoked_certificate)
+        RevokedCertificate.objects.create(certificate=revoked_certificate, reason='Duplicado')
+        legacy = GeneratedCertificate.objects.create(template=self.template, verification_code='a' * 32)
+        get_verification_index(refresh=True)
+
+        with mock.patch('certificates.verification.index_version_is_shared', return_value=True), \
+                self.assertNumQueries(0):
+            self.assertEqual(check_verification_code(present).state, CODE_PRESENT)
+            self.assertEqual(check_verification_code(legacy.verification_code).state, CODE_PRESENT)
+            self.assertEqual(check_verification_code('b' * 32).state, CODE_ABSENT)
+            self.assertEqual(check_verification_code(present.replace('100524277', '100524278')).state, CODE_INVALID)
+            check = check_verification_code(revoked)
+        self.assertEqual((check.state, check.revocation['reason']), (CODE_REVOKED, 'Duplicado'))
+
+    def test_revocation_bumps_the_index(self):
+        certificate = GeneratedCertificate.objects.create(template=self.template, verification_code='pending-1')
+        code = self.issue(certificate)
+        index = get_verification_index(refresh=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            RevokedCertificate.objects.create(certificate=certificate, reason='Duplicado')
+        self.assertNotEqual(cache.get(INDEX_VERSION_KEY), index.version)
+        self.assertIsNot(get_verification_index(), index)
+        self.assertEqual(get_verification_index().lookup(code, certificate.id), CODE_REVOKED)
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        codes = BloomFilter(1000, 0.01)
+        for number in range(1000):
+            codes.add(f"codigo-{number}")
+        self.assertTrue(all(f"codigo-{number}" in codes for number in range(1000)))
+        false_positives = sum(f"otro-{number}" in codes for number in range(10000))
+        self.assertLess(false_positives, 300)
+
+    @override_settings(VERIFICATION_INDEX_MAX_AGE=0)
+    def test_unshared_cache_rebuilds_an_old_index(self):
+        index = get_verification_index(refresh=True)
+        self.assertIsNot(get_verification_index(), index)
+
+
+class CourseTableTests(TestCase):
+    def check_columns(self, tabla):
+        self.assertEqual(tabla._cellvalues[0], ['Periodo', 'Nombre de la Materia', 'Horas \\ Totales'])
+        self.assertEqual(tabla._argW, [1.1 * inch, 2.5 * inch, 0.8 * inch])
+        self.assertTrue(all(len(fila) == 3 for fila in tabla._cellvalues))
+
+    def test_unissued_pdf_gets_a_stand_in_code(self):
+        template = CertificateTemplate.objects.create(name='Prueba')
+        _, code = CertificateService.generate_pdf('100524277', sample_courses(), template, {})
+        self.assertEqual(read_verification_code(code).certificate_id, 0)
+
+    def test_unknown_fields_are_skipped(self):
+        rows = sample_courses().table_rows()
+        campos = ['periodo', 'profesor', 'materia', 'hr_cont']
+        with override_settings(CERTIFICATE_LONG_TABLE_ROWS=1000):
+            self.check_columns(CertificateService._course_table(rows, campos))
+        with override_settings(CERTIFICATE_LONG_TABLE_ROWS=0):
+            self.check_columns(CertificateService._course_table(rows, campos))
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        template = CertificateTemplate.objects.create(name='Prueba')
+        instant = datetime(2025, 3, 1, 12, 0, 0, 100, tzinfo=timezone.utc)
+        # c0 and c0b share their key's generated_at: the id breaks the tie
+        for code, offset in (('c400', 400), ('c200', 200), ('c0', 0), ('c0b', 0)):
+            certificate = GeneratedCertificate.objects.create(template=template, verification_code=code)
+            GeneratedCertificate.objects.filter(id=certificate.id).update(
+                generated_at=instant + timedelta(microseconds=offset))
+
+    @staticmethod
+    def page(url):
+        paginator = GeneratedCertificatePagination()
+        page = paginator.paginate_queryset(GeneratedCertificate.objects.all(), Request(APIRequestFactory().get(url)))
+        return [certificate.verification_code for certificate in page], paginator
+
+    def test_keys_within_a_millisecond_are_not_skipped(self):
+        seen = []
+        url = '/api/certificates/?page_size=1'
+        while url:
+            codes, paginator = self.page(url)
+            seen += codes
+            url = paginator.get_next_link()
+        self.assertEqual(seen, ['c400', 'c200', 'c0b', 'c0'])
+
+    def test_previous_link_returns_the_page_before(self):
+        first, paginator = self.page('/api/certificates/?page_size=2')
+        self.assertIsNone(paginator.get_previous_link())
+        second, paginator = self.page(paginator.get_next_link())
+        self.assertEqual((first, second), (['c400', 'c200'], ['c0b', 'c0']))
+        self.assertIsNone(paginator.get_next_link())
+
+        codes, paginator = self.page(paginator.get_previous_link())
+        self.assertEqual(codes, first)
+        self.assertIsNone(paginator.get_previous_link())
+        self.assertEqual(self.page(paginator.get_next_link())[0], second)
+
+    def test_count_only_on_request(self):
+        with self.assertNumQueries(1):
+            _, paginator = self.page('/api/certificates/?page_size=1')
+        self.assertIsNone(paginator.count)
+        self.assertEqual(self.page('/api/certificates/?page_size=1&count=exact')[1].count, 4)
+
+    def test_invalid_cursor_is_not_found(self):
+        for cursor in ('no-es-base64', 'e30', 'eyJ2IjpbMV19'):
+            with self.assertRaises(NotFound):
+                self.page(f"/api/certificates/?cursor={cursor}")
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        store_sample_courses(cupo=30)
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user('admin', user_type='administrator'))
+
+    def test_list_loads_and_returns_only_the_selected_fields(self):
+        url = '/api/certificates/courses-history/?page_size=3&fields=id,materia,fecha_inicio'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertNotIn('cupo', queries[-1]['sql'])
+        self.assertEqual(response.data['results'][0], {
+            'id': CoursesHistory.objects.order_by('periodo', 'id').first().id,
+            'materia': 'Calculo Diferencial',
+            'fecha_inicio': '2024-01-15',
+        })
+
+        # The next cursor is built from periodo even though it was not selected
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['materia'] for row in response.data['results']],
+                         ['Calculo Integral', 'Geometria Analitica'])
+
+    def test_omitted_fields(self):
+        row = self.client.get('/api/certificates/courses-history/?omit=cupo,insc').data['results'][0]
+        self.assertNotIn('cupo', row)
+        self.assertNotIn('insc', row)
+        self.assertIn('updated_at', row)
+
+    def test_retrieve_honours_fields(self):
+        course = CoursesHistory.objects.first()
+        response = self.client.get(f"/api/certificates/courses-history/{course.id}/?fields=nrc,cupo")
+        self.assertEqual(response.data, {'nrc': course.nrc, 'cupo': 30})
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), VERIFICATION_BUNDLE_SIGNING_KEY=None,
+                   VERIFICATION_BUNDLE_SHARED_KEY='clave', CERTIFICATE_SINGLE_FLIGHT=False)
+class DeltaBundleTests(TestCase):
+    def issue(self, certificate=None):
+        return CertificateService.issue_certificate(
+            '100524277', sample_courses(), self.template, {}, 'Docente', certificate=certificate)
+
+    @staticmethod
+    def lines(export):
+        with export.file.open('rb') as bundle:
+            return [json.loads(line) for line in gzip.open(bundle)][1:]
+
+    def setUp(self):
+        self.template = CertificateTemplate.objects.create(name='Prueba')
+
+    def test_replaced_and_deleted_codes(self):
+        kept, rerendered, deleted = self.issue(), self.issue(), self.issue()
+        export_verification_bundle()
+        old_code = rerendered.verification_code
+        # The template changed, so the certificate is re-rendered with a new code
+        self.template.updated_at += timedelta(seconds=1)
+        CertificateTemplate.objects.filter(id=self.template.id).update(updated_at=self.template.updated_at)
+        self.issue(rerendered)
+        self.assertNotEqual(rerendered.verification_code, old_code)
+        deleted_code = deleted.verification_code
+        deleted.delete()
+
+        lines = self.lines(export_verification_bundle(delta=True))
+        self.assertNotIn(kept.verification_code, [line['c'] for line in lines])
+        self.assertIn(rerendered.verification_code, [line['c'] for line in lines if 'r' not in line])
+        self.assertCountEqual([line['c'] for line in lines if line.get('r')], [old_code, deleted_code])
+
+
+    def assert_signature_round_trip(self, public_key_pem=None, other_key_pem=None):
+        self.issue()
+        export = export_verification_bundle()
+        with export.signature_file.open('rb') as signature_file:
+            signature = json.load(signature_file)
+        with export.file.open('rb') as bundle:
+            raw = bundle.read()
+
+        self.assertTrue(verify_bundle_signature(BytesIO(raw), signature, public_key_pem))
+        tampered = bytearray(raw)
+        tampered[-1] ^= 1
+        self.assertFalse(verify_bundle_signature(BytesIO(bytes(tampered)), signature, public_key_pem))
+        # A digest matching the file but signed with another key
+        forged = {**signature, 'sha256': hashlib.sha256(raw).hexdigest()}
+        if other_key_pem:
+            self.assertFalse(verify_bundle_signature(BytesIO(raw), forged, other_key_pem))
+        else:
+            with override_settings(VERIFICATION_BUNDLE_SHARED_KEY='otra clave'):
+                self.assertFalse(verify_bundle_signature(BytesIO(raw), forged))
+        return signature
+
+    def test_hmac_signature_round_trip(self):
+        self.assertEqual(self.assert_signature_round_trip()['algorithm'], 'hmac-sha256')
+
+    @skipUnless(CRYPTOGRAPHY_AVAILABLE, 'cryptography is not installed')
+    def test_ed25519_signature_round_trip(self):
+        key_dir = tempfile.mkdtemp()
+        public_key_pem = generate_signing_key(f"{key_dir}/firma.pem").encode()
+        other_key_pem = generate_signing_key(f"{key_dir}/otra.pem").encode()
+        with override_settings(VERIFICATION_BUNDLE_SIGNING_KEY=f"{key_dir}/firma.pem"):
+            signature = self.assert_signature_round_trip(public_key_pem, other_key_pem)
+        self.assertEqual(signature['algorithm'], 'ed25519')
+
+
+class RollupVerificationEventsTests(TestCase):
+    def test_counter_created_by_a_concurrent_run(self):
+        template = CertificateTemplate.objects.create(name='Prueba')
+        certificate = GeneratedCertificate.objects.create(template=template, verification_code='c1')
+        verified_at = datetime(2025, 3, 1, 12, tzinfo=timezone.utc)
+        VerificationEvent.objects.bulk_create([
+            VerificationEvent(verification_code='c1', certificate=certificate, result='valid', channel='public',
+                              verified_at=verified_at)
+            for _ in range(3)
+        ])
+
+        update = QuerySet.update
+
+        def racing_update(queryset, **kwargs):
+            if queryset.model is CertificateVerificationCount and not CertificateVerificationCount.objects.exists():
+                # Another run creates the counter between this update and the create
+                CertificateVerificationCount.objects.create(certificate=certificate, date=verified_at.date(), count=2)
+                return 0
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', autospec=True, side_effect=racing_update):
+            self.assertEqual(rollup_verification_events(), 3)
+        self.assertEqual(CertificateVerificationCount.objects.get().count, 5)
+        self.assertEqual(rollup_verification_events(), 0)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), CERTIFICATE_SINGLE_FLIGHT=False)
+class IssueAdmissionTests(TestCase):
+    def setUp(self):
+        self.template = CertificateTemplate.objects.create(name='Prueba')
+        self.admission = RenderAdmission(max_concurrency=1, queue_wait=0)
+
+    def issue(self):
+        with mock.patch('certificates.services.render_admission', self.admission):
+            return CertificateService.issue_certificate(
+                '100524277', sample_courses(), self.template, {}, 'Docente', fingerprint='huella')
+
+    def test_render_runs_in_the_slot_taken_by_issue(self):
+        self.issue()
+        self.assertEqual(self.admission.metrics()['admitted_total'], 1)
+
+    @contextmanager
+    def slot_taken_elsewhere(self):
+        busy, done = threading.Event(), threading.Event()
+
+        def render_elsewhere():
+            with self.admission.admit():
+                busy.set()
+                done.wait(5)
+
+        thread = threading.Thread(target=render_elsewhere)
+        thread.start()
+        busy.wait(5)
+        try:
+            yield
+        finally:
+            done.set()
+            thread.join()
+
+    def assert_rejected_without_queries(self):
+        with self.slot_taken_elsewhere(), self.assertNumQueries(0), self.assertRaises(RenderRejected):
+            self.issue()
+        self.assertEqual(self.admission.metrics()['rejected_total'], 1)
+
+    def test_rejected_request_stores_nothing(self):
+        self.assert_rejected_without_queries()
+
+    @override_settings(CERTIFICATE_SYNC_MAX_COURSES=100)
+    def test_rejected_request_is_answered_with_503_and_retry_after(self):
+        store_sample_courses()
+        self.admission.average_render_seconds = 4
+
+        with self.slot_taken_elsewhere(), \
+                mock.patch('certificates.services.render_admission', self.admission), \
+                mock.patch.object(views, '_queue_certificate_job', return_value=None):
+            response = APIClient().post('/api/certificates/request-public/', {'id_docente': '100524277'},
+                                        format='json')
+        self.assertEqual((response.status_code, response['Retry-After']), (503, '4'))
+        self.assertFalse(GeneratedCertificate.objects.exists())
+
+    @override_settings(CERTIFICATE_SINGLE_FLIGHT=True)
+    def test_shared_body_is_stamped_without_a_slot(self):
+        cache.clear()
+        with mock.patch.object(CertificateService, 'render_body', wraps=CertificateService.render_body) as render:
+            self.issue()
+            self.issue()
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(self.admission.metrics()['admitted_total'], 1)
+
+    @override_settings(CERTIFICATE_SINGLE_FLIGHT=True)
+    def test_rejected_leader_stores_nothing(self):
+        cache.clear()
+        self.assert_rejected_without_queries()
+
+    def test_render_key_changes_when_a_course_is_edited(self):
+        courses = sample_courses()
+        edited = ProfessorCourses([courses.first()._replace(updated_at=datetime(2025, 1, 1)), *list(courses)[1:]])
+        self.assertNotEqual(CertificateService.render_key('100524277', courses, self.template, {}),
+                            CertificateService.render_key('100524277', edited, self.template, {}))
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+        self.fail_first = False
+        self.started, self.release = threading.Event(), threading.Event()
+
+    def compute(self):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        if self.calls == 1 and self.fail_first:
+            raise RuntimeError('falló')
+        return f"cuerpo {self.calls}"
+
+    def run_concurrently(self, followers=4):
+        results = []
+
+        def call():
+            try:
+                results.append(single_flight('clave', self.compute))
+            except RuntimeError as e:
+                results.append(e)
+
+        threads = [threading.Thread(target=call)]
+        threads[0].start()
+        self.started.wait(5)
+        threads += [threading.Thread(target=call) for _ in range(followers)]
+        for thread in threads[1:]:
+            thread.start()
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_followers_share_the_leaders_result(self):
+        self.assertEqual(self.run_concurrently(), ['cuerpo 1'] * 5)
+        self.assertEqual(self.calls, 1)
+        # Kept for callers arriving shortly after
+        self.assertEqual(single_flight('clave', self.compute), 'cuerpo 1')
+        self.assertEqual(self.calls, 1)
+
+    def test_followers_recompute_when_the_leader_fails(self):
+        self.fail_first = True
+        results = self.run_concurrently(followers=1)
+        self.assertIsInstance(results[0], RuntimeError)
+        self.assertEqual((results[1], self.calls), ('cuerpo 2', 2))
+
+    @override_settings(CERTIFICATE_SINGLE_FLIGHT_WAIT=0)
+    def test_followers_stop_waiting_for_a_slow_leader(self):
+        leader = threading.Thread(target=single_flight, args=('clave', self.compute))
+        leader.start()
+        self.started.wait(5)
+        try:
+            self.assertEqual(single_flight('clave', lambda: 'propio'), 'propio')
+        finally:
+            self.release.set()
+            leader.join()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), CERTIFICATE_SINGLE_FLIGHT=False, CERTIFICATE_REUSE_WINDOW=300)
+class ReuseWindowTests(TestCase):
+    def setUp(self):
+        self.template = CertificateTemplate.objects.create(name='Prueba')
+        self.first = self.issue()
+
+    def issue(self, courses=None, options=None, professor=None):
+        certificate, _ = CertificateService.get_or_issue_certificate(
+            '100524277', courses or sample_courses(), self.template,
+            options or {'periodos_filtro': ['202425', '202435']}, 'Docente', professor=professor)
+        return certificate
+
+    def test_identical_request_gets_the_recent_certificate(self):
+        with mock.patch.object(CertificateService, 'generate_pdf') as generate_pdf:
+            self.assertEqual(self.issue(options={'periodos_filtro': ['202435', '202425']}), self.first)
+        generate_pdf.assert_not_called()
+
+    def test_changes_that_alter_the_document_issue_a_new_one(self):
+        courses = sample_courses()
+        edited = ProfessorCourses([courses.first()._replace(updated_at=datetime(2025, 1, 1)), *list(courses)[1:]])
+        self.assertNotEqual(self.issue(courses=edited), self.first)
+        self.assertNotEqual(self.issue(options={'periodos_filtro': ['202425']}), self.first)
+        professor = get_user_model().objects.create_user('docente', user_type='professor')
+        self.assertNotEqual(self.issue(professor=professor), self.first)
+
+        CertificateTemplate.objects.filter(id=self.template.id).update(
+            updated_at=self.template.updated_at + timedelta(seconds=1))
+        self.template.refresh_from_db()
+        self.assertNotEqual(self.issue(), self.first)
+
+    def test_revoked_or_old_certificates_are_not_reused(self):
+        RevokedCertificate.objects.create(certificate=self.first, reason='Duplicado')
+        second = self.issue()
+        self.assertNotEqual(second, self.first)
+
+        GeneratedCertificate.objects.filter(id=second.id).update(
+            generated_at=second.generated_at - timedelta(seconds=301))
+        self.assertNotIn(self.issue(), (self.first, second))
+
+    @override_settings(CERTIFICATE_REUSE_WINDOW=0)
+    def test_disabled_window(self):
+        self.assertNotEqual(self.issue(), self.first)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class IssueBatchTests(TestCase):
+    def test_each_certificate_is_laid_out_once(self):
+        template = CertificateTemplate.objects.create(name='Prueba')
+        entries = [
+            (id_docente, sample_courses(), {'id_docente': id_docente}, 'Docente')
+            for id_docente in ('100524277', '100018967')
+        ]
+        flowables = mock.patch.object(
+            CertificateService, '_certificate_flowables', wraps=CertificateService._certificate_flowables)
+        with tempfile.TemporaryFile() as output, flowables as laid_out, \
+                mock.patch.object(ProfessorCourses, 'load', side_effect=AssertionError):
+            certificates = CertificateService.issue_batch(entries, template, output)
+            output.seek(0)
+            merged_pages = len(PdfReader(output).pages)
+
+        self.assertEqual(laid_out.call_count, 2)
+        stored_pages = 0
+        for certificate in certificates:
+            certificate.refresh_from_db()
+            with certificate.file.open('rb') as stored:
+                pages = PdfReader(stored).pages
+                stored_pages += len(pages)
+                self.assertIn(certificate.verification_code, pages[-1].extract_text().replace('\n', ''))
+        self.assertEqual(stored_pages, merged_pages)
+
+
+class CertificateJobTests(TestCase):
+    def setUp(self):
+        self.template = CertificateTemplate.objects.create(name='Prueba')
+
+    def test_unfinished_job_is_answered_at_once(self):
+        job = CertificateJob.objects.create(id_docente='100524277', template=self.template, options={})
+        url = f"/api/certificates/request-public/jobs/{job.id}/?wait=25"
+        response = APIClient().get(url)
+        self.assertEqual((response.status_code, response['Retry-After']), (202, '2'))
+
+        CertificateJob.objects.filter(id=job.id).update(status=CertificateJob.STATUS_FAILED, error='Sin cursos')
+        response = APIClient().get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Retry-After', response)
+
+    def test_unreachable_broker_falls_back_at_once(self):
+        with mock.patch.object(views.render_certificate_job, 'apply_async',
+                               side_effect=OperationalError('Connection refused')) as apply_async:
+            self.assertIsNone(views._queue_certificate_job('100524277', self.template, {}))
+        self.assertEqual(apply_async.call_args.kwargs['retry_policy'], PUBLISH_RETRY_POLICY)
+        self.assertFalse(CertificateJob.objects.exists())
+
+
+@override_settings(CERTIFICATE_SYNC_MAX_COURSES=3)
+class RenderInBackgroundTests(SimpleTestCase):
+    def test_only_the_filtered_periods_count(self):
+        request = Request(APIRequestFactory().post('/api/certificates/request-public/'))
+        courses = sample_courses()
+        self.assertTrue(views._render_in_background(request, courses))
+        self.assertFalse(views._render_in_background(request, courses, ['202435']))
+        self.assertTrue(views._render_in_background(request, courses, ['202425', '202435']))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), CERTIFICATE_SINGLE_FLIGHT=False)
+class TemplatePreviewTests(TestCase):
+    def test_one_preview_is_queued_per_save(self):
+        with mock.patch('certificates.signals.render_template_preview_task.apply_async') as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                # save() stores the default table_fields in a second save
+                template = CertificateTemplate.objects.create(name='Prueba')
+        self.assertEqual(template.table_fields[0], 'periodo')
+        apply_async.assert_called_once_with((template.pk,), retry_policy=PUBLISH_RETRY_POLICY)
+
+    @skipUnless(PYMUPDF_AVAILABLE, 'PyMuPDF is not installed')
+    def test_preview_has_a_thumbnail(self):
+        template = CertificateTemplate.objects.create(name='Prueba')
+        preview, rendered = render_template_preview(template)
+        self.assertTrue(rendered)
+        with preview.preview_image.open('rb') as image:
+            self.assertEqual(image.read(8), b'\x89PNG\r\n\x1a\n')
+        self.assertEqual(render_template_preview(template), (preview, False))
@@ -12,7 +12,9 @@ urlpatterns = [
     path('', include(router.urls)),
     # Public API endpoints (no authentication required)
     path('request-public/', views.public_request_certificate, name='public-request-certificate'),
+    path('request-public/jobs/<uuid:job_id>/', views.public_certificate_job, name='public-certificate-job'),
     path('verify-public/', views.public_verify_certificate, name='public-verify-certificate'),
+    path('verify-batch-public/', views.public_verify_batch, name='public-verify-batch'),
     path('professors-public/', views.public_professors_list, name='public-professors-list'),
     path('templates-public/', views.public_templates_list, name='public-templates-list'),
     path('fields-public/', views.public_available_fields, name='public-available-fields'),
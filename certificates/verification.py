@@ -0,0 +1,352 @@
+# certificates/verification.py
+"""Signed verification codes that can be checked without a database lookup.
+
+A code looks like ``c1.<id>.<id_docente>.<issued>.<template>.<version>.<sig>``:
+numbers are base36, ``issued`` is days since 2000-01-01 and ``sig`` is a
+truncated HMAC-SHA256 (keyed with SECRET_KEY) over everything before it.
+Legacy MD5 codes (32 hex characters) are not signed and are only resolved
+through the database.
+
+Each process also keeps a VerificationIndex: a Bloom filter of every
+stored code plus the set of revoked codes, so unknown and revoked codes are
+answered without a query. It is rebuilt when the version key in the cache
+changes (see bump_verification_index) and, once older than
+VERIFICATION_INDEX_MAX_AGE, when a code issued after it is looked up. A
+cache that is not shared between processes cannot carry that version, so
+with one every index is rebuilt after VERIFICATION_INDEX_MAX_AGE.
+"""
+import base64
+import hmac
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from typing import NamedTuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils.crypto import salted_hmac
+
+from .bloom import BloomFilter
+
+CODE_PREFIX = 'c1'
+SIGNATURE_BYTES = 12
+KEY_SALT = 'certificates.verification.code'
+EPOCH = date(2000, 1, 1)
+# Code of a certificate record reserved before its PDF is rendered
+PENDING_CODE_PREFIX = 'pending-'
+
+
+class VerificationPayload(NamedTuple):
+    certificate_id: int
+    id_docente: str
+    issued_on: date
+    template_id: int
+    template_version: int
+
+    def as_dict(self):
+        return {
+            'id': self.certificate_id,
+            'id_docente': self.id_docente,
+            'issued_on': self.issued_on.isoformat(),
+            'template_id': self.template_id,
+            'template_version': self.template_version,
+        }
+
+
+def _to_base36(number):
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    if number == 0:
+        return '0'
+    encoded = ''
+    while number:
+        number, remainder = divmod(number, 36)
+        encoded = digits[remainder] + encoded
+    return encoded
+
+
+def _encode_id_docente(id_docente):
+    if id_docente.isascii() and id_docente.isalnum():
+        return id_docente
+    return '~' + base64.urlsafe_b64encode(id_docente.encode()).decode().rstrip('=')
+
+
+def _decode_id_docente(value):
+    if value.startswith('~'):
+        value = value[1:]
+        return base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)).decode()
+    return value
+
+
+def _signature(payload, secret=None):
+    digest = salted_hmac(KEY_SALT, payload, secret=secret, algorithm='sha256').digest()
+    return base64.urlsafe_b64encode(digest[:SIGNATURE_BYTES]).decode().rstrip('=')
+
+
+def get_template_version(template):
+    """Version number of a template: the timestamp of its last change"""
+    return int(template.updated_at.timestamp()) if template.updated_at else 0
+
+
+def make_verification_code(certificate_id, id_docente, issued_on, template_id, template_version):
+    """Build a signed verification code for a certificate"""
+    payload = '.'.join([
+        CODE_PREFIX,
+        _to_base36(certificate_id),
+        _encode_id_docente(str(id_docente)),
+        _to_base36((issued_on - EPOCH).days),
+        _to_base36(template_id),
+        _to_base36(template_version),
+    ])
+    return f"{payload}.{_signature(payload)}"
+
+
+def is_signed_code(code):
+    return code.startswith(f"{CODE_PREFIX}.")
+
+
+def read_verification_code(code):
+    """Check the signature of a signed code and decode it.
+
+    Returns a VerificationPayload, or None when the code is malformed or
+    the signature does not match (current SECRET_KEY or any fallback).
+    """
+    if not code.isascii():
+        return None
+    payload, _, signature = code.rpartition('.')
+    parts = payload.split('.')
+    if len(parts) != 6 or parts[0] != CODE_PREFIX:
+        return None
+
+    secrets = [settings.SECRET_KEY, *getattr(settings, 'SECRET_KEY_FALLBACKS', [])]
+    if not any(hmac.compare_digest(signature, _signature(payload, secret)) for secret in secrets):
+        return None
+
+    try:
+        return VerificationPayload(
+            certificate_id=int(parts[1], 36),
+            id_docente=_decode_id_docente(parts[2]),
+            issued_on=EPOCH + timedelta(days=int(parts[3], 36)),
+            template_id=int(parts[4], 36),
+            template_version=int(parts[5], 36),
+        )
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+INDEX_VERSION_KEY = 'certificates:verification_index:version'
+
+# lookup() / check_verification_code() results
+CODE_INVALID = 'invalid'
+CODE_ABSENT = 'absent'
+CODE_PRESENT = 'present'
+CODE_REVOKED = 'revoked'
+CODE_UNINDEXED = 'unindexed'
+
+
+class CodeCheck(NamedTuple):
+    state: str
+    payload: VerificationPayload = None
+    revocation: dict = None
+
+
+class VerificationIndex:
+    """Snapshot of the stored and revoked verification codes"""
+
+    def __init__(self, version, codes, revoked, max_certificate_id, capacity):
+        self.version = version
+        self.revoked = revoked
+        self.max_certificate_id = max_certificate_id
+        self.built_at = time.monotonic()
+        self.codes = BloomFilter(capacity, settings.VERIFICATION_BLOOM_ERROR_RATE)
+        for code in codes:
+            self.codes.add(code)
+
+    def lookup(self, code, certificate_id=None):
+        """Classify a code as absent, present (possibly), revoked or unindexed.
+
+        Signed codes for certificates issued after the snapshot was taken
+        (id above max_certificate_id) are unindexed: only the database knows.
+        So is a signed code missing from the snapshot: its signature proves
+        it was issued, and its record may have been pending or not yet
+        committed when the snapshot was taken.
+        """
+        if code in self.revoked:
+            return CODE_REVOKED
+        if certificate_id is not None and certificate_id > self.max_certificate_id:
+            return CODE_UNINDEXED
+        if code in self.codes:
+            return CODE_PRESENT
+        return CODE_ABSENT if certificate_id is None else CODE_UNINDEXED
+
+    def is_stale(self):
+        return time.monotonic() - self.built_at > settings.VERIFICATION_INDEX_MAX_AGE
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def build_verification_index(version):
+    from .models import GeneratedCertificate, RevokedCertificate
+
+    certificates = GeneratedCertificate.objects.exclude(verification_code__startswith=PENDING_CODE_PREFIX)
+    max_certificate_id = certificates.aggregate(max_id=Max('id'))['max_id'] or 0
+    # Certificates still being rendered get their code later: the snapshot
+    # only covers the ids below the oldest of them
+    first_pending = GeneratedCertificate.objects.filter(
+        verification_code__startswith=PENDING_CODE_PREFIX).aggregate(min_id=Min('id'))['min_id']
+    if first_pending is not None:
+        max_certificate_id = min(max_certificate_id, first_pending - 1)
+    capacity = max(1000, int(certificates.count() * 1.25))
+    revoked = {
+        code: {'revoked_at': revoked_at.isoformat(), 'reason': reason}
+        for code, revoked_at, reason in RevokedCertificate.objects.values_list(
+            'certificate__verification_code', 'revoked_at', 'reason')
+    }
+    return VerificationIndex(
+        version,
+        certificates.values_list('verification_code', flat=True).iterator(chunk_size=5000),
+        revoked,
+        max_certificate_id,
+        capacity
+    )
+
+
+def index_version_is_shared():
+    """Whether bump_verification_index() reaches the other processes"""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def _needs_rebuild(index, version):
+    if index is None or index.version != version:
+        return True
+    # Without a shared cache a bump made by another process is never seen
+    return not index_version_is_shared() and index.is_stale()
+
+
+def get_verification_index(refresh=False):
+    """Return this process's index, rebuilding it if the version changed"""
+    global _index
+    version = cache.get(INDEX_VERSION_KEY)
+    if version is None:
+        cache.add(INDEX_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(INDEX_VERSION_KEY)
+
+    index = _index
+    if refresh or _needs_rebuild(index, version):
+        with _index_lock:
+            # Another thread may have rebuilt it while we waited
+            if _index is index or _needs_rebuild(_index, version):
+                _index = build_verification_index(version)
+            index = _index
+    return index
+
+
+async def aget_verification_index(refresh=False):
+    """Async get_verification_index(): only a rebuild leaves the event loop"""
+    version = await cache.aget(INDEX_VERSION_KEY)
+    index = _index
+    if refresh or version is None or _needs_rebuild(index, version):
+        index = await sync_to_async(get_verification_index)(refresh=refresh)
+    return index
+
+
+def bump_verification_index():
+    """Invalidate every process's index once the current transaction commits"""
+    transaction.on_commit(lambda: cache.set(INDEX_VERSION_KEY, uuid.uuid4().hex, None))
+
+
+def _read_code(code):
+    """Return (invalid, payload) for a signed or legacy code"""
+    if not is_signed_code(code):
+        return False, None
+    payload = read_verification_code(code)
+    return payload is None, payload
+
+
+def _stored_revocation(code):
+    """The revocation of code in the database, or None"""
+    from .models import RevokedCertificate
+
+    revocation = RevokedCertificate.objects.filter(certificate__verification_code=code).values(
+        'revoked_at', 'reason').first()
+    if revocation is None:
+        return None
+    return {'revoked_at': revocation['revoked_at'].isoformat(), 'reason': revocation['reason']}
+
+
+def certificate_revocation(certificate):
+    """The revocation of a certificate loaded with select_related('revocation'), or None"""
+    try:
+        revocation = certificate.revocation
+    except ObjectDoesNotExist:
+        return None
+    return {'revoked_at': revocation.revoked_at.isoformat(), 'reason': revocation.reason}
+
+
+def _needs_stored_revocation(check):
+    """A present code may have been revoked by another process after the index was built.
+
+    With a shared cache the revocation bumps this index, so the index is the
+    answer; without one only the database knows.
+    """
+    return check.state == CODE_PRESENT and not index_version_is_shared()
+
+
+def _with_stored_revocation(check, code):
+    revocation = _stored_revocation(code)
+    if revocation is None:
+        return check
+    return CodeCheck(CODE_REVOKED, check.payload, revocation)
+
+
+def check_verification_code(code, check_revocation=True):
+    """Answer what can be known about a code from the index.
+
+    CODE_INVALID and CODE_ABSENT are final (bad signature / never issued),
+    CODE_REVOKED carries the revocation, CODE_PRESENT means the code is in
+    the index and not revoked and CODE_UNINDEXED that only the database
+    knows; for both the record has to be loaded to return its details.
+    When the cache is not shared a present code also costs a revocation
+    query, unless check_revocation is False because the caller loads the
+    record with its revocation anyway.
+    """
+    invalid, payload = _read_code(code)
+    if invalid:
+        return CodeCheck(CODE_INVALID)
+
+    certificate_id = payload.certificate_id if payload else None
+    index = get_verification_index()
+    state = index.lookup(code, certificate_id)
+    if state == CODE_UNINDEXED and index.is_stale():
+        index = get_verification_index(refresh=True)
+        state = index.lookup(code, certificate_id)
+    check = CodeCheck(state, payload, index.revoked.get(code))
+    if check_revocation and _needs_stored_revocation(check):
+        check = _with_stored_revocation(check, code)
+    return check
+
+
+async def acheck_verification_code(code):
+    """Async check_verification_code()"""
+    invalid, payload = _read_code(code)
+    if invalid:
+        return CodeCheck(CODE_INVALID)
+
+    certificate_id = payload.certificate_id if payload else None
+    index = await aget_verification_index()
+    state = index.lookup(code, certificate_id)
+    if state == CODE_UNINDEXED and index.is_stale():
+        index = await aget_verification_index(refresh=True)
+        state = index.lookup(code, certificate_id)
+    check = CodeCheck(state, payload, index.revoked.get(code))
+    if _needs_stored_revocation(check):
+        check = await sync_to_async(_with_stored_revocation)(check, code)
+    return check
@@ -1,44 +1,76 @@
 # certificates/views.py
 from rest_framework import viewsets, permissions, status
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import action, api_view, parser_classes, permission_classes
 from rest_framework.response import Response
-from rest_framework.parsers import MultiPartParser
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.permissions import AllowAny
+from django.conf import settings
 from django.db import models, transaction
 from django.http import FileResponse
 import pandas as pd
 import logging
+import os
+import tempfile
 from core.decorators import user_type_required
-from .models import CertificateTemplate, GeneratedCertificate, CoursesHistory
+from core.idempotency import idempotent
+from core.routers import read_from_replica, ReplicaReadMixin
+from .models import CertificateTemplate, GeneratedCertificate, CoursesHistory, RevokedCertificate, CertificateJob
 from .serializers import (
     CertificateTemplateSerializer,
     GeneratedCertificateSerializer,
     CoursesHistorySerializer,
+    CoursesHistoryListSerializer,
+    COURSES_HISTORY_FIELDS,
+    parse_sparse_fields,
     GenerateCertificateSerializer,
     VerifyCertificateSerializer,
+    BatchVerifyCertificateSerializer,
     QuickGenerateSerializer,
     BulkGenerateSerializer
 )
 from .services import CertificateService
+from .admission import render_admission, RenderRejected
+from .course_loader import load_professor_courses
+from .previews import preview_urls
+from .tasks import PUBLISH_RETRY_POLICY, render_certificate_job
+from .audit import record_verification
+from .verification import (
+    certificate_revocation,
+    check_verification_code,
+    CODE_INVALID,
+    CODE_ABSENT,
+    CODE_PRESENT,
+    CODE_REVOKED,
+    CODE_UNINDEXED
+)
+from .pagination import CoursesHistoryPagination, GeneratedCertificatePagination
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Seconds a client should wait before asking again for an unfinished job
+JOB_RETRY_AFTER = 2
+
 
 # Public API endpoints (no authentication required)
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@idempotent
 def public_request_certificate(request):
-    """Public endpoint to request a certificate without authentication"""
-    serializer = GenerateCertificateSerializer(data=request.data)
+    """Public endpoint to request a certificate without authentication.
+
+    Retries carrying the same Idempotency-Key header get the original
+    response instead of a new certificate.
+    """
+    serializer = GenerateCertificateSerializer(data=request.data, context={'request': request})
     if not serializer.is_valid():
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     data = serializer.validated_data
     id_docente = data.get('id_docente')
 
-    # Get courses for this professor
-    courses = CoursesHistory.objects.filter(id_docente=id_docente)
+    # Get courses for this professor (already loaded by the serializer)
+    courses = load_professor_courses(id_docente, request)
     if not courses.exists():
         return Response({
             'error': f'No se encontraron cursos para el ID docente: {id_docente}'
@@ -76,44 +108,27 @@ def public_request_certificate(request):
             'campos': ['periodo', 'materia', 'clave', 'nrc', 'fecha_inicio', 'fecha_fin', 'hr_cont']
         }
 
-        # Generate PDF using the service method
-        pdf_content, verification_code = CertificateService.generate_pdf(
-            id_docente=id_docente,
-            courses=courses,
-            template=template,
-            options=options
-        )
+        if _render_in_background(request, courses, options['periodos_filtro']):
+            accepted = _queue_certificate_job(id_docente, template, options)
+            if accepted:
+                return accepted
 
-        # Save certificate record (no professor user required)
-        certificate = GeneratedCertificate.objects.create(
-            professor=None,  # No user account required
-            template=template,
-            verification_code=verification_code,
-            metadata={
-                **options,
-                'professor_name': professor_name
-            }
-        )
+        # Generate and store the PDF with a signed verification code, or
+        # hand out an identical one issued moments ago
+        try:
+            certificate, created = CertificateService.get_or_issue_certificate(
+                id_docente=id_docente,
+                courses=courses,
+                template=template,
+                options=options,
+                professor_name=professor_name
+            )
+        except RenderRejected as e:
+            # Too many renders in this process: hand the request to a worker
+            return _queue_certificate_job(id_docente, template, options) or render_rejected_response(e)
 
-        # Save PDF file
-        filename = f"certificate_{id_docente}_{verification_code[:8]}.pdf"
-        certificate.file.save(filename, pdf_content)
-
-        # Return certificate info
-        return Response({
-            'success': True,
-            'message': f'Certificado generado exitosamente para {professor_name}',
-            'certificate': {
-                'id': certificate.id,
-                'verification_code': verification_code,
-                'professor_name': professor_name,
-                'id_docente': id_docente,
-                'template_name': template.name,
-                'file_url': certificate.file.url if certificate.file else None,
-                'generated_at': certificate.generated_at.isoformat(),
-                'verification_url': f"/api/certificates/verify-public/?code={verification_code}"
-            }
-        }, status=status.HTTP_201_CREATED)
+        return Response(certificate_payload(certificate, reused=not created),
+                        status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
     except Exception as e:
         logger.error(f"Error generating certificate: {str(e)}")
@@ -123,10 +138,117 @@ def public_request_certificate(request):
         }, status=status.HTTP_400_BAD_REQUEST)
 
 
+def _queue_certificate_job(id_docente, template, options):
+    """Queue a background render and return the 202 response, or None without a broker"""
+    job = CertificateJob.objects.create(id_docente=id_docente, template=template, options=options)
+    try:
+        render_certificate_job.apply_async((str(job.id),), retry_policy=PUBLISH_RETRY_POLICY)
+    except Exception as e:
+        logger.error(f"Could not queue certificate job {job.id}: {e}")
+        job.delete()
+        return None
+    data = job_payload(job)
+    return Response(data, status=status.HTTP_202_ACCEPTED, headers={'Location': data['job']['status_url']})
+
+
+def render_rejected_response(exc):
+    return Response({
+        'success': False,
+        'error': str(exc)
+    }, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': str(exc.retry_after)})
+
+
+def _render_in_background(request, courses, periodos_filtro=None):
+    """Large requests, or clients sending ``Prefer: respond-async``, get a 202 and a job.
+
+    Only the courses the certificate lists count: those in periodos_filtro, when given.
+    """
+    if 'respond-async' in request.headers.get('Prefer', ''):
+        return True
+    if periodos_filtro:
+        courses = courses.in_periodos(periodos_filtro)
+    return courses.count() > settings.CERTIFICATE_SYNC_MAX_COURSES
+
+
+def certificate_payload(certificate, reused=False):
+    """Response body for an issued (or reused) public certificate request"""
+    professor_name = certificate.metadata.get('professor_name')
+    verification_code = certificate.verification_code
+    return {
+        'success': True,
+        'reused': reused,
+        'message': f'Certificado generado exitosamente para {professor_name}',
+        'certificate': {
+            'id': certificate.id,
+            'verification_code': verification_code,
+            'professor_name': professor_name,
+            'id_docente': certificate.metadata.get('id_docente'),
+            'template_name': certificate.template.name,
+            'file_url': certificate.file.url if certificate.file else None,
+            'generated_at': certificate.generated_at.isoformat(),
+            'verification_url': f"/api/certificates/verify-public/?code={verification_code}"
+        }
+    }
+
+
+def job_payload(job):
+    """Response body describing a background certificate request"""
+    data = {
+        'success': job.status != CertificateJob.STATUS_FAILED,
+        'job': {
+            'id': str(job.id),
+            'status': job.status,
+            'status_url': f"/api/certificates/request-public/jobs/{job.id}/",
+            'created_at': job.created_at.isoformat(),
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None
+        }
+    }
+    if job.status == CertificateJob.STATUS_DONE:
+        if job.certificate:
+            data.update(certificate_payload(job.certificate, job.reused))
+        else:
+            data.update(success=False, error='El certificado generado ya no existe')
+    elif job.status == CertificateJob.STATUS_FAILED:
+        data['error'] = f'Error generando certificado: {job.error}'
+    else:
+        data['message'] = 'Certificado en proceso'
+    return data
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
+def public_certificate_job(request, job_id):
+    """Status of a certificate request rendered in the background.
+
+    Answers at once, with 202 and Retry-After while the job is unfinished:
+    holding the request would tie up a WSGI worker. The ASGI view
+    (async_views.public_certificate_job) also honours ?wait=N.
+    """
+    job = CertificateJob.objects.select_related('certificate__template').filter(id=job_id).first()
+    if job is None:
+        return Response({'success': False, 'error': 'Solicitud no encontrada'},
+                        status=status.HTTP_404_NOT_FOUND)
+    response_status, headers = job_status(job)
+    return Response(job_payload(job), status=response_status, headers=headers)
+
+
+def job_status(job):
+    """Status code and headers of a job status response"""
+    if job.is_finished:
+        return status.HTTP_200_OK, {}
+    return status.HTTP_202_ACCEPTED, {'Retry-After': str(JOB_RETRY_AFTER)}
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@read_from_replica
 def public_verify_certificate(request):
-    """Public endpoint to verify a certificate by verification code"""
+    """Public endpoint to verify a certificate by verification code.
+
+    Signed codes are checked in process and unknown or revoked codes are
+    answered from the verification index, without touching the database;
+    the stored record is only loaded with ?details=1 or for legacy codes.
+    """
     verification_code = request.GET.get('code')
     
     if not verification_code:
@@ -135,13 +257,52 @@ def public_verify_certificate(request):
             'error': 'Código de verificación requerido. Use: ?code=VERIFICATION_CODE'
         }, status=status.HTTP_400_BAD_REQUEST)
 
+    not_found = Response({
+        'success': False,
+        'valid': False,
+        'message': 'Certificado no encontrado o código inválido',
+        'verification_code': verification_code
+    }, status=status.HTTP_404_NOT_FOUND)
+
+    check = check_verification_code(verification_code)
+    certificate_id = check.payload.certificate_id if check.payload else None
+    if check.state in (CODE_INVALID, CODE_ABSENT):
+        record_verification(request, verification_code, 'invalid' if check.state == CODE_INVALID else 'not_found',
+                            'public')
+        return not_found
+    if check.state == CODE_REVOKED:
+        record_verification(request, verification_code, 'revoked', 'public', certificate_id)
+        return Response(revoked_payload(verification_code, check.revocation))
+
+    details = request.GET.get('details') in ('1', 'true')
+    if check.payload and check.state == CODE_PRESENT and not details:
+        record_verification(request, verification_code, 'valid', 'public', certificate_id)
+        return Response({
+            'success': True,
+            'valid': True,
+            'message': 'Certificado válido',
+            'certificate': {
+                **check.payload.as_dict(),
+                'verification_code': verification_code
+            },
+            'details_url': f"/api/certificates/verify-public/?code={verification_code}&details=1"
+        })
+
     try:
-        certificate = GeneratedCertificate.objects.get(verification_code=verification_code)
-        
+        certificate = GeneratedCertificate.objects.select_related('template', 'revocation').get(
+            verification_code=verification_code)
+
+        # Revoked after this process's index was built
+        revocation = certificate_revocation(certificate)
+        if revocation:
+            record_verification(request, verification_code, 'revoked', 'public', certificate.id)
+            return Response(revoked_payload(verification_code, revocation))
+
         # Get professor name from metadata
         professor_name = certificate.metadata.get('professor_name', 'Unknown')
         id_docente = certificate.metadata.get('id_docente', 'Unknown')
-        
+
+        record_verification(request, verification_code, 'valid', 'public', certificate.id)
         return Response({
             'success': True,
             'valid': True,
@@ -159,16 +320,99 @@ def public_verify_certificate(request):
         })
         
     except GeneratedCertificate.DoesNotExist:
-        return Response({
-            'success': False,
-            'valid': False,
-            'message': 'Certificado no encontrado o código inválido',
-            'verification_code': verification_code
-        }, status=status.HTTP_404_NOT_FOUND)
+        record_verification(request, verification_code, 'not_found', 'public')
+        return not_found
+
+
+def revoked_payload(verification_code, revocation):
+    """Response body for a revoked code"""
+    return {
+        'success': True,
+        'valid': False,
+        'revoked': True,
+        'message': 'Certificado revocado',
+        'verification_code': verification_code,
+        **revocation
+    }
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@parser_classes([JSONParser, MultiPartParser])
+@read_from_replica
+def public_verify_batch(request):
+    """Public endpoint to verify many certificates in one request.
+
+    Accepts {"codes": [...]} as JSON or a CSV upload in ``file``; all codes
+    that may exist are resolved, with their revocations, in a single query.
+    """
+    serializer = BatchVerifyCertificateSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    codes = serializer.validated_data['codes']
+
+    # Forged, unknown and revoked codes are answered from the verification index
+    checks = {code: check_verification_code(code, check_revocation=False) for code in codes}
+    certificates = {
+        certificate.verification_code: certificate
+        for certificate in GeneratedCertificate.objects.select_related('template', 'revocation').filter(
+            verification_code__in=[code for code, check in checks.items()
+                                   if check.state in (CODE_PRESENT, CODE_UNINDEXED)])
+    }
+
+    results = []
+    valid_count = 0
+    for code in codes:
+        check = checks[code]
+        certificate = certificates.get(code)
+        revocation = check.revocation
+        if certificate is not None:
+            # A revocation made after the index was built is only in the record
+            revocation = certificate_revocation(certificate)
+        if revocation:
+            certificate_id = certificate.id if certificate else check.payload.certificate_id if check.payload else None
+            record_verification(request, code, 'revoked', 'batch', certificate_id)
+            results.append({'verification_code': code, 'valid': False, 'status': 'revoked', **revocation})
+            continue
+
+        if certificate is None:
+            result = 'invalid' if check.state == CODE_INVALID else 'not_found'
+            record_verification(request, code, result, 'batch')
+            results.append({
+                'verification_code': code,
+                'valid': False,
+                'status': result
+            })
+            continue
+
+        record_verification(request, code, 'valid', 'batch', certificate.id)
+        valid_count += 1
+
+        results.append({
+            'verification_code': code,
+            'valid': True,
+            'status': 'valid',
+            'certificate': {
+                'id': certificate.id,
+                'professor_name': certificate.metadata.get('professor_name', 'Unknown'),
+                'id_docente': certificate.metadata.get('id_docente', 'Unknown'),
+                'template_name': certificate.template.name,
+                'generated_at': certificate.generated_at.isoformat()
+            }
+        })
+
+    return Response({
+        'success': True,
+        'count': len(results),
+        'valid_count': valid_count,
+        'results': results
+    })
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@read_from_replica
 def public_professors_list(request):
     """Public endpoint to get list of available professors"""
     professors = CoursesHistory.objects.values('id_docente', 'profesor').annotate(
@@ -196,10 +440,19 @@ def public_professors_list(request):
 @permission_classes([AllowAny])
 def public_templates_list(request):
     """Public endpoint to get available certificate templates"""
-    templates = CertificateTemplate.objects.filter(is_active=True).values(
-        'id', 'name', 'description', 'layout_type', 'is_default'
-    )
-    
+    templates = [
+        {
+            'id': template.id,
+            'name': template.name,
+            'description': template.description,
+            'layout_type': template.layout_type,
+            'is_default': template.is_default,
+            # Sample certificate rendered in the background (previews.py)
+            **preview_urls(template)
+        }
+        for template in CertificateTemplate.objects.filter(is_active=True).select_related('templatepreview')
+    ]
+
     return Response({
         'success': True,
         'count': len(templates),
@@ -207,22 +460,27 @@ def public_templates_list(request):
     })
 
 
+PUBLIC_API_INFO = {
+    'message': 'Certificate API v1.0',
+    'endpoints': {
+        'request_certificate': '/api/certificates/request-public/',
+        'certificate_job': '/api/certificates/request-public/jobs/<id>/?wait=25',
+        'verify_certificate': '/api/certificates/verify-public/',
+        'verify_batch': '/api/certificates/verify-batch-public/',
+        'list_professors': '/api/certificates/professors-public/',
+        'list_templates': '/api/certificates/templates-public/',
+        'available_fields': '/api/certificates/fields-public/',
+        'api_info': '/api/certificates/api-info/'
+    },
+    'description': 'Public API for certificate generation and verification'
+}
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def public_api_info(request):
     """Get API information and documentation"""
-    return Response({
-        'message': 'Certificate API v1.0',
-        'endpoints': {
-            'request_certificate': '/api/certificates/request-public/',
-            'verify_certificate': '/api/certificates/verify-public/',
-            'list_professors': '/api/certificates/professors-public/',
-            'list_templates': '/api/certificates/templates-public/',
-            'available_fields': '/api/certificates/fields-public/',
-            'api_info': '/api/certificates/api-info/'
-        },
-        'description': 'Public API for certificate generation and verification'
-    })
+    return Response(PUBLIC_API_INFO)
 
 
 @api_view(['GET'])
@@ -284,10 +542,11 @@ class CertificateTemplateViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 
-class CoursesHistoryViewSet(viewsets.ModelViewSet):
+class CoursesHistoryViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = CoursesHistory.objects.all()
     serializer_class = CoursesHistorySerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CoursesHistoryPagination
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -302,8 +561,22 @@ class CoursesHistoryViewSet(viewsets.ModelViewSet):
         if profesor:
             queryset = queryset.filter(profesor__icontains=profesor)
 
+        # Only load the columns selected with ?fields= / ?omit=
+        fields = parse_sparse_fields(self.request, COURSES_HISTORY_FIELDS)
+        if self.action == 'list':
+            # The pagination key is always needed to build the next cursor
+            key_fields = [name for name in CoursesHistoryPagination.ordering if name not in fields]
+            queryset = queryset.values(*fields, *key_fields)
+        elif self.action == 'retrieve':
+            queryset = queryset.only(*fields)
+
         return queryset
 
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return CoursesHistoryListSerializer
+        return super().get_serializer_class()
+
     @action(detail=False, methods=['post'], parser_classes=[MultiPartParser])
     @user_type_required(['administrator'])
     def import_from_excel(self, request):
@@ -498,10 +771,12 @@ class CoursesHistoryViewSet(viewsets.ModelViewSet):
                             status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class CertificateViewSet(viewsets.ModelViewSet):
+class CertificateViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = GeneratedCertificate.objects.all()
     serializer_class = GeneratedCertificateSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = GeneratedCertificatePagination
+    replica_actions = ('list', 'professors_list')
 
     def get_queryset(self):
         user = self.request.user
@@ -534,17 +809,18 @@ class CertificateViewSet(viewsets.ModelViewSet):
         return None
 
     @action(detail=False, methods=['post'])
+    @idempotent
     def generate(self, request):
-        """Generate a new certificate using only id_docente"""
-        serializer = GenerateCertificateSerializer(data=request.data)
+        """Generate a new certificate using only id_docente (honours Idempotency-Key)"""
+        serializer = GenerateCertificateSerializer(data=request.data, context={'request': request})
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         data = serializer.validated_data
         id_docente = data.get('id_docente')
 
-        # Get courses for this professor
-        courses = CoursesHistory.objects.filter(id_docente=id_docente)
+        # Get courses for this professor (already loaded by the serializer)
+        courses = load_professor_courses(id_docente, request)
         if not courses.exists():
             return Response({
                 'error': f'No se encontraron cursos para el ID docente: {id_docente}'
@@ -582,28 +858,15 @@ class CertificateViewSet(viewsets.ModelViewSet):
                 'campos': ['periodo', 'materia', 'clave', 'nrc', 'fecha_inicio', 'fecha_fin', 'hr_cont']
             }
 
-            # Generate PDF using the service method
-            pdf_content, verification_code = CertificateService.generate_pdf(
+            # Generate and store the PDF with a signed verification code
+            certificate = CertificateService.issue_certificate(
                 id_docente=id_docente,
                 courses=courses,
                 template=template,
-                options=options
-            )
-
-            # Save certificate record (no professor user required)
-            certificate = GeneratedCertificate.objects.create(
-                professor=None,  # No user account required
-                template=template,
-                verification_code=verification_code,
-                metadata={
-                    **options,
-                    'professor_name': professor_name
-                }
+                options=options,
+                professor_name=professor_name
             )
-
-            # Save PDF file
-            filename = f"certificate_{id_docente}_{verification_code[:8]}.pdf"
-            certificate.file.save(filename, pdf_content)
+            verification_code = certificate.verification_code
 
             # Return certificate info
             return Response({
@@ -617,6 +880,8 @@ class CertificateViewSet(viewsets.ModelViewSet):
                 'message': f'Certificado generado exitosamente para {professor_name}'
             }, status=status.HTTP_201_CREATED)
 
+        except RenderRejected as e:
+            return render_rejected_response(e)
         except Exception as e:
             return Response({
                 'error': f'Error generando certificado: {str(e)}'
@@ -629,7 +894,7 @@ class CertificateViewSet(viewsets.ModelViewSet):
         """Enhanced certificate generation with single/bulk modes and period filtering"""
         from .serializers import EnhancedGenerateCertificateSerializer
 
-        serializer = EnhancedGenerateCertificateSerializer(data=request.data)
+        serializer = EnhancedGenerateCertificateSerializer(data=request.data, context={'request': request})
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -668,12 +933,12 @@ class CertificateViewSet(viewsets.ModelViewSet):
             id_docente = data.get('id_docente')
 
             try:
-                # Get courses for this professor
-                courses = CoursesHistory.objects.filter(id_docente=id_docente)
+                # Get courses for this professor (already loaded by the serializer)
+                courses = load_professor_courses(id_docente, request)
 
                 # Apply period filter if specified
                 if common_options['periodos_filtro']:
-                    filtered_courses = courses.filter(periodo__in=common_options['periodos_filtro'])
+                    filtered_courses = courses.in_periodos(common_options['periodos_filtro'])
                     if filtered_courses.exists():
                         courses = filtered_courses
                     else:
@@ -687,28 +952,15 @@ class CertificateViewSet(viewsets.ModelViewSet):
                 options = dict(common_options)
                 options['id_docente'] = id_docente
 
-                # Generate PDF
-                pdf_content, verification_code = CertificateService.generate_pdf(
+                # Generate and store the PDF with a signed verification code
+                certificate = CertificateService.issue_certificate(
                     id_docente=id_docente,
                     courses=courses,
                     template=template,
-                    options=options
+                    options=options,
+                    professor_name=professor_name
                 )
-
-                # Save certificate record
-                certificate = GeneratedCertificate.objects.create(
-                    professor=None,
-                    template=template,
-                    verification_code=verification_code,
-                    metadata={
-                        **options,
-                        'professor_name': professor_name
-                    }
-                )
-
-                # Save PDF file
-                filename = f"certificate_{id_docente}_{verification_code[:8]}.pdf"
-                certificate.file.save(filename, pdf_content)
+                verification_code = certificate.verification_code
 
                 return Response({
                     'id': certificate.id,
@@ -723,6 +975,8 @@ class CertificateViewSet(viewsets.ModelViewSet):
                         'periodos_filtro'] else 'all'
                 }, status=status.HTTP_201_CREATED)
 
+            except RenderRejected as e:
+                return render_rejected_response(e)
             except Exception as e:
                 return Response({
                     'error': f'Error generando certificado: {str(e)}'
@@ -757,28 +1011,15 @@ class CertificateViewSet(viewsets.ModelViewSet):
                     current_options = dict(common_options)
                     current_options['id_docente'] = id_docente
 
-                    # Generate PDF
-                    pdf_content, verification_code = CertificateService.generate_pdf(
+                    # Generate and store the PDF with a signed verification code
+                    certificate = CertificateService.issue_certificate(
                         id_docente=id_docente,
                         courses=courses,
                         template=template,
-                        options=current_options
+                        options=current_options,
+                        professor_name=professor_name
                     )
-
-                    # Save certificate record
-                    certificate = GeneratedCertificate.objects.create(
-                        professor=None,
-                        template=template,
-                        verification_code=verification_code,
-                        metadata={
-                            **current_options,
-                            'professor_name': professor_name
-                        }
-                    )
-
-                    # Save PDF file
-                    filename = f"certificate_{id_docente}_{verification_code[:8]}.pdf"
-                    certificate.file.save(filename, pdf_content)
+                    verification_code = certificate.verification_code
 
                     generated_certificates.append({
                         'id': certificate.id,
@@ -846,6 +1087,29 @@ class CertificateViewSet(viewsets.ModelViewSet):
         response['Content-Disposition'] = f'attachment; filename="{certificate.file.name}"'
         return response
 
+    @action(detail=True, methods=['post'])
+    @user_type_required(['administrator'])
+    def revoke(self, request, pk=None):
+        """Revoke a certificate; the record and its PDF are kept"""
+        certificate = self.get_object()
+        revocation, created = RevokedCertificate.objects.get_or_create(
+            certificate=certificate,
+            defaults={'reason': request.data.get('reason', ''), 'revoked_by': request.user}
+        )
+        return Response({
+            'id': certificate.id,
+            'verification_code': certificate.verification_code,
+            'revoked_at': revocation.revoked_at,
+            'reason': revocation.reason,
+            'message': 'Certificado revocado' if created else 'El certificado ya estaba revocado'
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='render-metrics')
+    @user_type_required(['administrator'])
+    def render_metrics(self, request):
+        """Render admission counters of the process serving this request"""
+        return Response({'pid': os.getpid(), **render_admission.metrics()})
+
     @action(detail=False, methods=['post'])
     def verify(self, request):
         """Verify a certificate by its code"""
@@ -855,13 +1119,37 @@ class CertificateViewSet(viewsets.ModelViewSet):
 
         verification_code = serializer.validated_data['verification_code']
 
+        # Forged or never issued codes cannot match any record
+        check = check_verification_code(verification_code)
+        if check.state in (CODE_INVALID, CODE_ABSENT):
+            record_verification(request, verification_code,
+                                'invalid' if check.state == CODE_INVALID else 'not_found', 'api')
+            return Response({
+                'valid': False,
+                'message': 'Certificate not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+
         try:
-            certificate = GeneratedCertificate.objects.get(verification_code=verification_code)
+            certificate = GeneratedCertificate.objects.select_related('revocation').get(
+                verification_code=verification_code)
+            revocation = getattr(certificate, 'revocation', None)
+            record_verification(request, verification_code, 'revoked' if revocation else 'valid', 'api',
+                                certificate.id)
+            if revocation:
+                return Response({
+                    'valid': False,
+                    'revoked': True,
+                    'message': 'Certificate revoked',
+                    'revoked_at': revocation.revoked_at,
+                    'reason': revocation.reason,
+                    'certificate': GeneratedCertificateSerializer(certificate).data
+                })
             return Response({
                 'valid': True,
                 'certificate': GeneratedCertificateSerializer(certificate).data
             })
         except GeneratedCertificate.DoesNotExist:
+            record_verification(request, verification_code, 'not_found', 'api')
             return Response({
                 'valid': False,
                 'message': 'Certificate not found'
@@ -925,12 +1213,13 @@ class CertificateViewSet(viewsets.ModelViewSet):
         }
 
         generated_certificates = []
+        merged = []
         errors = []
 
         for id_docente in id_docentes:
             try:
                 # Get professor info from course history
-                courses = CoursesHistory.objects.filter(id_docente=id_docente)
+                courses = load_professor_courses(id_docente)
                 if not courses.exists():
                     errors.append({
                         'id_docente': id_docente,
@@ -944,28 +1233,20 @@ class CertificateViewSet(viewsets.ModelViewSet):
                 current_options = dict(common_options)
                 current_options['id_docente'] = id_docente
 
-                # Generate PDF
-                pdf_content, verification_code = CertificateService.generate_pdf(
+                if data['output'] == 'merged':
+                    # Rendered together below
+                    merged.append((id_docente, courses, current_options, professor_name))
+                    continue
+
+                # Generate and store the PDF with a signed verification code
+                certificate = CertificateService.issue_certificate(
                     id_docente=id_docente,
                     courses=courses,
                     template=template,
-                    options=current_options
-                )
-
-                # Save certificate record
-                certificate = GeneratedCertificate.objects.create(
-                    professor=None,  # No user account required
-                    template=template,
-                    verification_code=verification_code,
-                    metadata={
-                        **current_options,
-                        'professor_name': professor_name
-                    }
+                    options=current_options,
+                    professor_name=professor_name
                 )
-
-                # Save PDF file
-                filename = f"certificate_{id_docente}_{verification_code[:8]}.pdf"
-                certificate.file.save(filename, pdf_content)
+                verification_code = certificate.verification_code
 
                 generated_certificates.append({
                     'id': certificate.id,
@@ -981,6 +1262,27 @@ class CertificateViewSet(viewsets.ModelViewSet):
                     'error': str(e)
                 })
 
+        if merged:
+            # One print-ready PDF, spooled to a temporary file and streamed
+            # from it; each stored certificate is cut from its pages
+            batch = tempfile.TemporaryFile()
+            try:
+                generated_certificates = CertificateService.issue_batch(merged, template, batch)
+            except RenderRejected as e:
+                batch.close()
+                return render_rejected_response(e)
+            except Exception as e:
+                batch.close()
+                logger.exception("Bulk merged generation failed")
+                return Response({'error': f'No se pudo generar el lote: {str(e)}'},
+                                status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            batch.seek(0)
+            response = FileResponse(batch, as_attachment=True, filename='certificados_lote.pdf',
+                                    content_type='application/pdf', status=status.HTTP_201_CREATED)
+            response['X-Certificates-Generated'] = len(generated_certificates)
+            response['X-Certificates-Errors'] = len(errors)
+            return response
+
         return Response({
             'generated': len(generated_certificates),
             'errors': len(errors),
@@ -0,0 +1,116 @@
+# core/idempotency.py
+"""Idempotency-Key support for POST endpoints that create resources.
+
+The first request with a given key runs the view and, if it succeeds,
+its response is kept in the cache for IDEMPOTENCY_KEY_TTL seconds; retries
+with the same key get that response back (with an ``Idempotent-Replayed``
+header) instead of running the view again. A retry that arrives while the
+first request is still running waits up to IDEMPOTENCY_WAIT_SECONDS for
+its result. Keys are scoped per view and per user, and reusing a key with
+a different body is rejected. Failed requests are not stored, so they can
+be retried with the same key.
+
+The cache has to be shared between workers (Redis) for this to hold
+across processes.
+"""
+import hashlib
+import json
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http.request import RawPostDataException
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.1
+
+STATE_PENDING = 'pending'
+STATE_DONE = 'done'
+
+
+def _cache_key(request, view_name, key):
+    user = request.user.pk if request.user.is_authenticated else 'anon'
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f"idempotency:{view_name}:{user}:{digest}"
+
+
+def _fingerprint(request):
+    try:
+        body = request.body
+    except RawPostDataException:
+        # A multipart body was already consumed by the parser
+        body = json.dumps(request.data, sort_keys=True, default=str).encode()
+    return hashlib.sha256(body).hexdigest()
+
+
+def _replay(entry):
+    return Response(entry['data'], status=entry['status'], headers={REPLAYED_HEADER: 'true'})
+
+
+def _wait_for_result(cache_key, fingerprint):
+    """Wait for the request holding cache_key; return its entry, or None if it went away"""
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        entry = cache.get(cache_key)
+        if entry is None or entry['state'] == STATE_DONE or entry['fingerprint'] != fingerprint:
+            return entry
+        if time.monotonic() >= deadline:
+            return entry
+        time.sleep(POLL_INTERVAL)
+
+
+def idempotent(view_func):
+    """Decorator for function views and ViewSet actions honouring Idempotency-Key"""
+    @wraps(view_func)
+    def _wrapped_view(*args, **kwargs):
+        request = args[0] if isinstance(args[0], Request) else args[1]
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_func(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({
+                'error': f'{IDEMPOTENCY_HEADER} no puede exceder {MAX_KEY_LENGTH} caracteres'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        cache_key = _cache_key(request, view_func.__qualname__, key)
+        fingerprint = _fingerprint(request)
+
+        while not cache.add(cache_key, {'state': STATE_PENDING, 'fingerprint': fingerprint},
+                            settings.IDEMPOTENCY_LOCK_SECONDS):
+            entry = _wait_for_result(cache_key, fingerprint)
+            if entry is None:
+                # The first request failed or expired; claim the key again
+                continue
+            if entry['fingerprint'] != fingerprint:
+                return Response({
+                    'error': f'{IDEMPOTENCY_HEADER} ya se usó con una solicitud diferente'
+                }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if entry['state'] == STATE_DONE:
+                return _replay(entry)
+            return Response({
+                'error': 'Una solicitud con el mismo Idempotency-Key sigue en proceso'
+            }, status=status.HTTP_409_CONFLICT, headers={'Retry-After': str(settings.IDEMPOTENCY_WAIT_SECONDS)})
+
+        try:
+            response = view_func(*args, **kwargs)
+        except Exception:
+            cache.delete(cache_key)
+            raise
+
+        if status.is_success(response.status_code) and isinstance(response, Response):
+            cache.set(cache_key, {
+                'state': STATE_DONE,
+                'fingerprint': fingerprint,
+                'status': response.status_code,
+                'data': response.data,
+            }, settings.IDEMPOTENCY_KEY_TTL)
+        else:
+            cache.delete(cache_key)
+        return response
+    return _wrapped_view
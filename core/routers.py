@@ -0,0 +1,140 @@
+# core/routers.py
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+PIN_COOKIE_NAME = 'db_primary_pin'
+
+# Whether reads in the current request may go to the replica
+_replica_reads = ContextVar('replica_reads', default=False)
+# Set when the client wrote to the primary in one of its last requests
+_pinned_to_primary = ContextVar('pinned_to_primary', default=False)
+# Set once the current request writes to the primary
+_wrote_to_primary = ContextVar('wrote_to_primary', default=False)
+
+
+def get_replica_alias():
+    """Return the configured replica alias, or None when no replica is set up"""
+    alias = getattr(settings, 'REPLICA_DATABASE_ALIAS', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+class ReplicaRouter:
+    """Send reads from replica-enabled views to the read replica.
+
+    Writes always go to the primary and pin the rest of the request (and,
+    through a cookie, the client's next requests) to the primary so it
+    reads its own writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and not (_pinned_to_primary.get() or _wrote_to_primary.get()):
+            return get_replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        _wrote_to_primary.set(True)
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives schema changes through replication
+        if db == get_replica_alias():
+            return False
+        return None
+
+
+@contextmanager
+def replica_reads():
+    """Route reads inside the block to the replica (unless pinned to the primary)"""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def read_from_replica(view_func):
+    """Decorator for function views whose reads may be served by the replica"""
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def _async_view(*args, **kwargs):
+            with replica_reads():
+                return await view_func(*args, **kwargs)
+        return _async_view
+
+    @wraps(view_func)
+    def _wrapped_view(*args, **kwargs):
+        with replica_reads():
+            return view_func(*args, **kwargs)
+    return _wrapped_view
+
+
+class ReplicaReadMixin:
+    """ViewSet mixin: serve the actions listed in replica_actions from the replica"""
+    replica_actions = ('list',)
+
+    def initial(self, request, *args, **kwargs):
+        if self.action in self.replica_actions:
+            _replica_reads.set(True)
+        super().initial(request, *args, **kwargs)
+
+
+class ReplicaRoutingMiddleware:
+    """Reset routing state per request and keep recent writers on the primary.
+
+    Supports both sync and async handlers so ASGI requests don't cross a
+    thread boundary here.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        tokens = self._start(request)
+        try:
+            return self._finish(self.get_response(request))
+        finally:
+            self._reset(tokens)
+
+    async def __acall__(self, request):
+        tokens = self._start(request)
+        try:
+            return self._finish(await self.get_response(request))
+        finally:
+            self._reset(tokens)
+
+    def _start(self, request):
+        return (
+            _replica_reads.set(False),
+            _pinned_to_primary.set(PIN_COOKIE_NAME in request.COOKIES),
+            _wrote_to_primary.set(False),
+        )
+
+    def _finish(self, response):
+        if _wrote_to_primary.get() and get_replica_alias():
+            response.set_cookie(
+                PIN_COOKIE_NAME, '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax'
+            )
+        return response
+
+    def _reset(self, tokens):
+        reads_token, pinned_token, wrote_token = tokens
+        _replica_reads.reset(reads_token)
+        _pinned_to_primary.reset(pinned_token)
+        _wrote_to_primary.reset(wrote_token)
@@ -0,0 +1,23 @@
+# core/signals.py
+import logging
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """Apply settings.SQLITE_PRAGMAS to every new SQLite connection"""
+    if connection.vendor != 'sqlite':
+        return
+
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            if not name.isidentifier() or not str(value).lstrip('-').isalnum():
+                logger.warning(f"Ignoring invalid SQLite pragma {name}={value}")
+                continue
+            cursor.execute(f"PRAGMA {name} = {value}")
@@ -1,4 +1,66 @@
 # core/tests
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
 
-# Create your tests here.
+from .idempotency import IDEMPOTENCY_HEADER, REPLAYED_HEADER, idempotent
+
+
+@override_settings(IDEMPOTENCY_WAIT_SECONDS=0)
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = []
+        self.while_running = None
+
+        @api_view(['POST'])
+        @permission_classes([AllowAny])
+        @idempotent
+        def create(request):
+            self.calls.append(request.data)
+            if self.while_running:
+                self.while_running()
+            if not request.data.get('nombre'):
+                return Response({'error': 'nombre requerido'}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({'id': len(self.calls)}, status=status.HTTP_201_CREATED)
+
+        self.view = create
+
+    def post(self, data, key='clave-1'):
+        headers = {IDEMPOTENCY_HEADER: key} if key else {}
+        return self.view(APIRequestFactory().post('/crear/', data, format='json', headers=headers))
+
+    def test_retry_replays_the_first_response(self):
+        first = self.post({'nombre': 'a'})
+        retry = self.post({'nombre': 'a'})
+        self.assertEqual((retry.status_code, retry.data), (201, {'id': 1}))
+        self.assertEqual(retry[REPLAYED_HEADER], 'true')
+        self.assertNotIn(REPLAYED_HEADER, first)
+        self.assertEqual(len(self.calls), 1)
+
+        self.assertEqual(self.post({'nombre': 'a'}, key='clave-2').data, {'id': 2})
+        self.assertEqual(self.post({'nombre': 'a'}, key=None).data, {'id': 3})
+
+    def test_key_reused_with_another_body_is_rejected(self):
+        self.post({'nombre': 'a'})
+        self.assertEqual(self.post({'nombre': 'b'}).status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_failed_request_can_be_retried(self):
+        self.assertEqual(self.post({}).status_code, 400)
+        self.assertEqual(self.post({}).status_code, 400)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_retry_while_the_first_request_runs(self):
+        retries = []
+        self.while_running = lambda: retries.append(self.post({'nombre': 'a'}))
+        self.assertEqual(self.post({'nombre': 'a'}).status_code, 201)
+        self.assertEqual((retries[0].status_code, retries[0]['Retry-After']), (409, '0'))
+
+        self.while_running = None
+        self.assertEqual(self.post({'nombre': 'a'})[REPLAYED_HEADER], 'true')
+        self.assertEqual(len(self.calls), 1)
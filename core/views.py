@@ -15,6 +15,7 @@ from .serializers import (
     SurveyOptionSerializer, SurveyResponseSerializer
 )
 from .decorators import user_type_required
+from .routers import ReplicaReadMixin
 from .tasks import execute_script
 
 
@@ -30,7 +31,7 @@ class IsAdminOrReadOnly(permissions.BasePermission):
         return request.user.is_administrator()
 
 
-class NewsViewSet(viewsets.ModelViewSet):
+class NewsViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = News.objects.filter(published=True)
     serializer_class = NewsSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
@@ -52,10 +53,11 @@ class NewsViewSet(viewsets.ModelViewSet):
         return Response({'status': 'news published'})
 
 
-class EventViewSet(viewsets.ModelViewSet):
+class EventViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Event.objects.all()
     serializer_class = EventSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    replica_actions = ('list', 'upcoming')
 
     def perform_create(self, serializer):
         serializer.save(organizer=self.request.user)
@@ -67,7 +69,7 @@ class EventViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class ScheduleViewSet(viewsets.ModelViewSet):
+class ScheduleViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Schedule.objects.all()
     serializer_class = ScheduleSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -82,7 +84,7 @@ class ScheduleViewSet(viewsets.ModelViewSet):
         return Schedule.objects.all()
 
 
-class SupportRequestViewSet(viewsets.ModelViewSet):
+class SupportRequestViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = SupportRequest.objects.all()
     serializer_class = SupportRequestSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -121,7 +123,7 @@ class SupportRequestViewSet(viewsets.ModelViewSet):
         return Response({'status': 'request resolved'})
 
 
-class SurveyViewSet(viewsets.ModelViewSet):
+class SurveyViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Survey.objects.all()
     serializer_class = SurveySerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -160,7 +162,7 @@ class SurveyViewSet(viewsets.ModelViewSet):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class ProfessorViewSet(viewsets.ModelViewSet):
+class ProfessorViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = UserSerializer
 
@@ -175,7 +177,7 @@ class ProfessorViewSet(viewsets.ModelViewSet):
         return Response({'task_id': task.id})
 
 
-class AdministratorViewSet(viewsets.ModelViewSet):
+class AdministratorViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = UserSerializer
 
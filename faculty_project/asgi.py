@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'faculty_project.settings')
+# Serve the async verification views (certificates/async_views.py)
+os.environ.setdefault('ROOT_URLCONF', 'faculty_project.asgi_urls')
 
 application = get_asgi_application()
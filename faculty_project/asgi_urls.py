@@ -0,0 +1,17 @@
+# faculty_project/asgi_urls.py
+"""URLconf used under ASGI: the public verification and job status
+endpoints are served by their async variants, everything else by the
+regular URLconf."""
+from django.urls import path
+
+from certificates import async_views
+from .urls import urlpatterns as wsgi_urlpatterns
+
+urlpatterns = [
+    path('api/certificates/verify-public/', async_views.public_verify_certificate,
+         name='public-verify-certificate-async'),
+    path('api/certificates/request-public/jobs/<uuid:job_id>/', async_views.public_certificate_job,
+         name='public-certificate-job-async'),
+    path('api/certificates/api-info/', async_views.public_api_info, name='public-api-info-async'),
+    *wsgi_urlpatterns,
+]